@@ -0,0 +1,210 @@
+# Flow matching ODE samplers (Euler, Heun, DPM-Solver++ multistep)
+# The model is a denoiser returning the x0 prediction, as produced by fm_wrapper,
+# for the flow x_sigma = (1 - sigma) * x0 + sigma * noise with sigmas going from 1 to 0.
+
+
+import torch
+
+from tqdm.auto import trange
+
+
+def expand_dims(v, dims):
+    return v[(...,) + (None,) * (dims - 1)]
+
+
+def sigma_to_lambda(sigma, eps=1e-6):
+    """
+    Half log-SNR of the flow, log(alpha / sigma) with alpha = 1 - sigma. Clamped so sigma 0 and 1 stay finite.
+    """
+    sigma = sigma.double().clamp(eps, 1 - eps)
+    return torch.log1p(-sigma) - torch.log(sigma)
+
+
+def run_callback(callback, x, i, denoised, sampler_name):
+    if callback is None:
+        return False
+    callback_result = callback({'x': x, 'i': i, 'denoised': denoised})
+    if callback_result == 'cancel':
+        print(f"Cancellation signal received in {sampler_name}, stopping generation")
+        return True
+    return False
+
+
+@torch.no_grad()
+def sample_euler(model, noise, sigmas, extra_args=None, callback=None, disable=False):
+    extra_args = {} if extra_args is None else extra_args
+    x = noise
+    for i in trange(len(sigmas) - 1, disable=disable):
+        sigma, sigma_next = sigmas[i], sigmas[i + 1]
+        denoised = model(x, sigma.expand(x.shape[0]), **extra_args)
+        # x - denoised is sigma times the flow velocity, so this is one Euler step along the ODE
+        x = denoised + (sigma_next / sigma) * (x - denoised)
+
+        if run_callback(callback, x, i, denoised, 'sample_euler'):
+            return denoised
+
+    return x
+
+
+@torch.no_grad()
+def sample_heun(model, noise, sigmas, extra_args=None, callback=None, disable=False):
+    extra_args = {} if extra_args is None else extra_args
+    x = noise
+    for i in trange(len(sigmas) - 1, disable=disable):
+        sigma, sigma_next = sigmas[i], sigmas[i + 1]
+        denoised = model(x, sigma.expand(x.shape[0]), **extra_args)
+        d = (x - denoised) / sigma
+        x_euler = x + (sigma_next - sigma) * d
+
+        if sigma_next > 0:
+            # Trapezoidal correction with the slope at the Euler estimate (second model call)
+            denoised_next = model(x_euler, sigma_next.expand(x.shape[0]), **extra_args)
+            d_next = (x_euler - denoised_next) / sigma_next
+            x = x + (sigma_next - sigma) * (d + d_next) / 2
+        else:
+            x = x_euler
+
+        if run_callback(callback, x, i, denoised, 'sample_heun'):
+            return denoised
+
+    return x
+
+
+class FlowMatchDPMSolverPlusPlus:
+    """
+    Multistep DPM-Solver++ (data prediction) for flow matching, with alpha = 1 - sigma.
+    Order 2 is the usual "DPM++ 2M" midpoint solver and order 3 adds a second-order difference term.
+    Lower orders are used while the history is short and on the final step.
+    """
+
+    def __init__(self, model, extra_args, order=2):
+        assert order in (1, 2, 3)
+        self.model = model
+        self.extra_args = {} if extra_args is None else extra_args
+        self.order = order
+
+    def update_fn(self, x, sigma, sigma_next, lambdas, denoised_list, order):
+        dims = x.dim()
+        lambda_s0, lambda_t = lambdas[-2], lambdas[-1]
+        h = lambda_t - lambda_s0
+        phi_1 = torch.expm1(-h)
+        alpha_t = 1 - sigma_next
+
+        m0 = denoised_list[-1]
+        x_t = expand_dims((sigma_next / sigma).to(x.dtype), dims) * x - (alpha_t * phi_1).to(x.dtype) * m0
+
+        if order >= 2:
+            m1 = denoised_list[-2]
+            h_0 = lambda_s0 - lambdas[-3]
+            r0 = h_0 / h
+            D1_0 = (m0 - m1) / r0.to(x.dtype)
+
+            if order == 2:
+                x_t = x_t - (0.5 * alpha_t * phi_1).to(x.dtype) * D1_0
+            else:
+                m2 = denoised_list[-3]
+                h_1 = lambdas[-3] - lambdas[-4]
+                r1 = h_1 / h
+                D1_1 = (m1 - m2) / r1.to(x.dtype)
+                D1 = D1_0 + (r0 / (r0 + r1)).to(x.dtype) * (D1_0 - D1_1)
+                D2 = (D1_0 - D1_1) / (r0 + r1).to(x.dtype)
+                x_t = (x_t
+                       + (alpha_t * (phi_1 / h + 1)).to(x.dtype) * D1
+                       - (alpha_t * ((phi_1 + h) / h ** 2 - 0.5)).to(x.dtype) * D2)
+
+        return x_t
+
+    @torch.no_grad()
+    def sample(self, x, sigmas, callback=None, disable_pbar=False):
+        lambdas = sigma_to_lambda(sigmas)
+        denoised_list = []
+        for i in trange(len(sigmas) - 1, disable=disable_pbar):
+            sigma, sigma_next = sigmas[i], sigmas[i + 1]
+            denoised = self.model(x, sigma.expand(x.shape[0]), **self.extra_args)
+            denoised_list = (denoised_list + [denoised])[-self.order:]
+
+            if sigma_next == 0:
+                x = denoised
+            else:
+                # Lower orders while the history warms up and towards the end of the schedule
+                order = min(self.order, len(denoised_list), len(sigmas) - 1 - i)
+                x = self.update_fn(x, sigma.double(), sigma_next.double(), lambdas[max(i - 2, 0):i + 2], denoised_list, order)
+
+            if run_callback(callback, x, i, denoised, 'sample_dpmpp'):
+                return denoised
+
+        return x
+
+
+def sample_dpmpp_2m(model, noise, sigmas, extra_args=None, callback=None, disable=False):
+    return FlowMatchDPMSolverPlusPlus(model, extra_args=extra_args, order=2).sample(noise, sigmas=sigmas, callback=callback, disable_pbar=disable)
+
+
+def sample_dpmpp_3m(model, noise, sigmas, extra_args=None, callback=None, disable=False):
+    return FlowMatchDPMSolverPlusPlus(model, extra_args=extra_args, order=3).sample(noise, sigmas=sigmas, callback=callback, disable_pbar=disable)
+
+
+@torch.no_grad()
+def sample_picard(model, noise, sigmas, extra_args=None, callback=None, disable=False, window_size=8, tolerance=0.01):
+    """
+    Parallel-in-time Euler sampling by Picard iteration (ParaDiGMS, https://arxiv.org/abs/2305.16317).
+    The latents of a sliding window of steps are denoised together as one batch, then all of them are
+    recomputed at once from the window start with the cumulative sum of the Euler updates. Steps whose
+    latent moved less than tolerance (RMS) since the last iteration are final and the window slides past
+    them, so the number of sequential model calls follows the iterations instead of the step count.
+    With tolerance 0 the result is the sequential Euler solution, up to float summation order.
+
+    The model is called with window_size times the batch, stacked step-major, and a per-sample sigma.
+    """
+    extra_args = {} if extra_args is None else extra_args
+    num_steps = len(sigmas) - 1
+    batch_size = noise.shape[0]
+
+    # xs[i] is the current estimate of the latent before step i; entries past the window are filled lazily
+    xs = [noise] + [None] * num_steps
+    begin = 0
+    iterations = 0
+    evaluations = 0
+
+    pbar = trange(num_steps, disable=disable)
+    while begin < num_steps:
+        end = min(begin + window_size, num_steps)
+        for j in range(begin + 1, end + 1):
+            if xs[j] is None:
+                xs[j] = xs[j - 1]
+
+        x = torch.stack(xs[begin:end])
+        sigma = sigmas[begin:end]
+        denoised = model(x.flatten(0, 1), sigma.repeat_interleave(batch_size), **extra_args).view(x.shape)
+        iterations += 1
+        evaluations += end - begin
+
+        # Euler updates of every step in the window, chained from the (final) latent at the window start
+        step_sizes = expand_dims((sigmas[begin + 1:end + 1] - sigma) / sigma, x.dim()).to(x.dtype)
+        x_new = xs[begin] + torch.cumsum(step_sizes * (x - denoised), dim=0)
+
+        x_old = torch.stack(xs[begin + 1:end + 1])
+        errors = (x_new - x_old).pow(2).flatten(2).mean(dim=2).amax(dim=1).sqrt()
+
+        # The first latent after the window start is always exact, and so is every one up to the
+        # first latent that still moved more than the tolerance (its update used a converged input)
+        not_converged = (errors > tolerance).tolist()
+        stride = not_converged.index(True) + 1 if True in not_converged else end - begin
+
+        for j in range(end - begin):
+            xs[begin + 1 + j] = x_new[j]
+
+        for i in range(begin, begin + stride):
+            pbar.update(1)
+            if run_callback(callback, xs[i + 1], i, denoised[i - begin], 'sample_picard'):
+                pbar.close()
+                return denoised[i - begin]
+
+        # Finalized latents are no longer needed
+        for i in range(begin, begin + stride):
+            xs[i] = None
+        begin += stride
+
+    pbar.close()
+    print(f'Picard sampling: {num_steps} steps in {iterations} parallel iterations ({evaluations} step evaluations).')
+    return xs[num_steps]
@@ -108,9 +108,15 @@ class FlowMatchUniPC:
 
         return x_t, model_t
 
-    def sample(self, x, sigmas, callback=None, disable_pbar=False):
+    def sample(self, x, sigmas, callback=None, disable_pbar=False, early_exit_tolerance=None, early_exit_min_steps=0):
         order = min(3, len(sigmas) - 2)
         model_prev_list, t_prev_list = [], []
+        previous_denoised = None
+
+        # Exit needs a previous estimate (step 2 onwards) and is never taken on the final step
+        num_steps = len(sigmas) - 1
+        if early_exit_tolerance and max(1, early_exit_min_steps - 1) > num_steps - 2:
+            print(f"Early exit cannot trigger with {num_steps} steps and a minimum of {early_exit_min_steps}, running all steps.")
         for i in trange(len(sigmas) - 1, disable=disable_pbar):
             vec_t = sigmas[i].expand(x.shape[0])
 
@@ -136,9 +142,20 @@ class FlowMatchUniPC:
                     print("Cancellation signal received in sample_unipc, stopping generation")
                     return model_prev_list[-1]  # Return current denoised result
 
+            # Early exit: once the x0 estimate stops changing, jump straight to the final sigma
+            # (the previous estimate is kept separately, since the history is trimmed to the solver order)
+            denoised = model_prev_list[-1]
+            if early_exit_tolerance and i + 1 >= early_exit_min_steps and previous_denoised is not None and i < len(sigmas) - 2:
+                relative_change = ((denoised - previous_denoised).abs().mean() / previous_denoised.abs().mean().clamp_min(1e-6)).item()
+                if relative_change < early_exit_tolerance:
+                    print(f"Denoised estimate converged (relative change {relative_change:.4f}) after {i + 1} of {len(sigmas) - 1} steps")
+                    return denoised
+            previous_denoised = denoised
+
         return model_prev_list[-1]
 
 
-def sample_unipc(model, noise, sigmas, extra_args=None, callback=None, disable=False, variant='bh1'):
+def sample_unipc(model, noise, sigmas, extra_args=None, callback=None, disable=False, variant='bh1', early_exit_tolerance=None, early_exit_min_steps=0):
     assert variant in ['bh1', 'bh2']
-    return FlowMatchUniPC(model, extra_args=extra_args, variant=variant).sample(noise, sigmas=sigmas, callback=callback, disable_pbar=disable)
+    return FlowMatchUniPC(model, extra_args=extra_args, variant=variant).sample(noise, sigmas=sigmas, callback=callback, disable_pbar=disable,
+                                                                               early_exit_tolerance=early_exit_tolerance, early_exit_min_steps=early_exit_min_steps)
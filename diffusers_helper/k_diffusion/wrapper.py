@@ -1,5 +1,7 @@
 import torch
 
+from diffusers_helper.utils import repeat_to_batch_size
+
 
 def append_dims(x, target_dims):
     return x[(...,) + (None,) * (target_dims - x.ndim)]
@@ -16,30 +18,210 @@ def rescale_noise_cfg(noise_cfg, noise_pred_text, guidance_rescale=1.0):
     return noise_cfg
 
 
+def pad_to_length(x, length, dim=1):
+    if x.shape[dim] >= length:
+        return x
+    pad_shape = list(x.shape)
+    pad_shape[dim] = length - x.shape[dim]
+    return torch.cat([x, torch.zeros(pad_shape, dtype=x.dtype, device=x.device)], dim=dim)
+
+
+def concat_cfg_kwargs(positive, negative, batch_size):
+    """
+    Stacks the positive and negative transformer kwargs along the batch dimension,
+    so both CFG branches can be evaluated in a single forward pass.
+    Text embeddings are padded to a common length; the padding is masked out by the attention mask.
+    Returns None if the two branches cannot be stacked.
+    """
+    text_length = max(positive['encoder_hidden_states'].shape[1], negative['encoder_hidden_states'].shape[1])
+
+    merged = {}
+    for k, v in positive.items():
+        n = negative.get(k)
+        if not isinstance(v, torch.Tensor) or not isinstance(n, torch.Tensor):
+            if v is not n:
+                return None
+            merged[k] = v
+            continue
+        v, n = repeat_to_batch_size(v, batch_size), repeat_to_batch_size(n, batch_size).to(v)
+        if k in ('encoder_hidden_states', 'encoder_attention_mask'):
+            v, n = pad_to_length(v, text_length), pad_to_length(n, text_length)
+        merged[k] = torch.cat([v, n], dim=0)
+
+    return merged
+
+
+# Spatial tile starts are kept on this latent grid, so the 4x clean-latent embedder's
+# patches (8 latent pixels) and their RoPE positions line up with the untiled frame
+TILE_ALIGNMENT = 8
+
+# Inputs that are spatially aligned with the noisy latents and must be cropped per tile
+TILED_KWARGS = ('clean_latents', 'clean_latents_2x', 'clean_latents_4x')
+
+
+def clamp_tile_size(tile_size, tile_overlap, alignment=TILE_ALIGNMENT):
+    """
+    Returns a tile size of at least one alignment step and even (the 2x2 patchify floors odd sizes,
+    which breaks the RoPE/token count match), and an overlap that leaves a stride of at least one
+    alignment step, so neighbouring tiles always touch.
+    """
+    tile_size = max(tile_size, alignment) // 2 * 2
+    tile_overlap = max(min(tile_overlap, tile_size - alignment), 0)
+    return tile_size, tile_overlap
+
+
+def get_tile_spans(length, tile_size, tile_overlap, alignment=TILE_ALIGNMENT):
+    """
+    Splits [0, length) into overlapping (start, end) spans of about tile_size, with aligned starts.
+    The last span is stretched to reach the end of the axis.
+    """
+    tile_size, tile_overlap = clamp_tile_size(tile_size, tile_overlap, alignment)
+    if length <= tile_size:
+        return [(0, length)]
+
+    stride = max(tile_size - tile_overlap, alignment) // alignment * alignment
+    last_start = (length - tile_size) // alignment * alignment
+    starts = list(range(0, last_start, stride)) + [last_start]
+    spans = [(start, min(start + tile_size, length)) if start != last_start else (start, length) for start in starts]
+    assert all(end >= next_start for (_, end), (next_start, _) in zip(spans, spans[1:])), f'Tiles {spans} do not cover [0, {length})'
+    return spans
+
+
+def get_tile_blend_weights(start, end, length, tile_overlap, device):
+    # Linear ramps on the edges shared with neighbouring tiles; image borders keep full weight
+    position = torch.arange(end - start, device=device, dtype=torch.float32)
+    weights = torch.ones_like(position)
+    if start > 0:
+        weights = torch.minimum(weights, (position + 1) / (tile_overlap + 1))
+    if end < length:
+        weights = torch.minimum(weights, (end - start - position) / (tile_overlap + 1))
+    return weights
+
+
+def tiled_transformer_forward(transformer, hidden_states, timestep, cache_branch, transformer_kwargs, tile_size, tile_overlap, crop_memo):
+    """
+    Runs the transformer on overlapping spatial tiles of the latent frame and blends the predictions.
+    Each tile uses RoPE positions offset to its place in the full frame, and its own step cache
+    branch, so peak memory is bounded by the tile size while the result approximates a full forward.
+    """
+    B, C, T, H, W = hidden_states.shape
+    p = transformer.config['patch_size']
+    tile_size, tile_overlap = clamp_tile_size(tile_size, tile_overlap)
+
+    pred = None
+    weight_sum = torch.zeros((1, 1, 1, H, W), device=hidden_states.device, dtype=torch.float32)
+
+    for y0, y1 in get_tile_spans(H, tile_size, tile_overlap):
+        for x0, x1 in get_tile_spans(W, tile_size, tile_overlap):
+            # Crops are memoized so every step sees identical tensors and the transformer's conditioning cache hits
+            memo_key = (id(transformer_kwargs), y0, y1, x0, x1)
+            memo = crop_memo.get(memo_key)
+            if memo is None or memo[0] is not transformer_kwargs:
+                cropped = {k: v[..., y0:y1, x0:x1] if k in TILED_KWARGS and v is not None else v for k, v in transformer_kwargs.items()}
+                memo = crop_memo[memo_key] = (transformer_kwargs, cropped)
+
+            tile_pred = transformer(
+                hidden_states=hidden_states[..., y0:y1, x0:x1], timestep=timestep,
+                cache_branch=f'{cache_branch}@{y0},{x0}', rope_offset=(y0 // p, x0 // p),
+                return_dict=False, **memo[1]
+            )[0].float()
+
+            weights = get_tile_blend_weights(y0, y1, H, tile_overlap, hidden_states.device)[:, None] * get_tile_blend_weights(x0, x1, W, tile_overlap, hidden_states.device)[None, :]
+
+            if pred is None:
+                pred = torch.zeros((tile_pred.shape[0], tile_pred.shape[1], T, H, W), device=hidden_states.device, dtype=torch.float32)
+            pred[..., y0:y1, x0:x1] += tile_pred * weights
+            weight_sum[..., y0:y1, x0:x1] += weights
+
+    return pred / weight_sum
+
+
+def repeat_kwargs_to_batch_size(transformer_kwargs, batch_size):
+    return {k: repeat_to_batch_size(v, batch_size) if isinstance(v, torch.Tensor) else v for k, v in transformer_kwargs.items()}
+
+
 def fm_wrapper(transformer, t_scale=1000.0):
+    # The stacked CFG kwargs are built once and reused, so the transformer sees identical
+    # conditioning tensors on every step and can keep its section-constant cache
+    batched_cfg_memo = []
+    tile_crop_memo = {}
+    # Same for kwargs repeated to a larger batch of latents (parallel samplers batch several steps)
+    repeated_memo = {}
+
+    def get_repeated_kwargs(transformer_kwargs, batch_size):
+        if transformer_kwargs['encoder_hidden_states'].shape[0] == batch_size:
+            return transformer_kwargs
+        memo_key = (id(transformer_kwargs), batch_size)
+        memo = repeated_memo.get(memo_key)
+        if memo is None or memo[0] is not transformer_kwargs:
+            memo = repeated_memo[memo_key] = (transformer_kwargs, repeat_kwargs_to_batch_size(transformer_kwargs, batch_size))
+        return memo[1]
+
+    def get_batched_cfg_kwargs(positive, negative, batch_size):
+        if batched_cfg_memo:
+            memo_positive, memo_negative, memo_batch_size, merged = batched_cfg_memo[0]
+            if memo_positive is positive and memo_negative is negative and memo_batch_size == batch_size:
+                return merged
+        merged = concat_cfg_kwargs(positive, negative, batch_size)
+        batched_cfg_memo[:] = [(positive, negative, batch_size, merged)]
+        return merged
+
+    def run_transformer(hidden_states, timestep, cache_branch, transformer_kwargs, tile_size, tile_overlap):
+        if tile_size:
+            return tiled_transformer_forward(transformer, hidden_states, timestep, cache_branch, transformer_kwargs, tile_size, tile_overlap, tile_crop_memo)
+        return transformer(hidden_states=hidden_states, timestep=timestep, cache_branch=cache_branch, return_dict=False, **transformer_kwargs)[0].float()
+
     def k_model(x, sigma, **extra_args):
         dtype = extra_args['dtype']
         cfg_scale = extra_args['cfg_scale']
         cfg_rescale = extra_args['cfg_rescale']
         concat_latent = extra_args['concat_latent']
+        tile_size = extra_args.get('tile_size')
+        tile_overlap = extra_args.get('tile_overlap', 0)
+        cfg_interval = extra_args.get('cfg_interval')
 
         original_dtype = x.dtype
         sigma = sigma.float()
 
+        # Guidance interval: outside [low, high] only the positive pass runs, as with cfg_scale 1.
+        # A batch mixing steps inside and outside the interval gets a per-sample scale.
+        if cfg_scale != 1.0 and cfg_interval is not None:
+            sigma_low, sigma_high = cfg_interval
+            in_interval = (sigma >= sigma_low) & (sigma <= sigma_high)
+            if not in_interval.any():
+                cfg_scale = 1.0
+            elif not in_interval.all():
+                cfg_scale = append_dims(1.0 + (cfg_scale - 1.0) * in_interval.float(), x.ndim)
+
         x = x.to(dtype)
         timestep = (sigma * t_scale).to(dtype)
 
         if concat_latent is None:
             hidden_states = x
         else:
-            hidden_states = torch.cat([x, concat_latent.to(x)], dim=1)
+            hidden_states = torch.cat([x, repeat_to_batch_size(concat_latent, x.shape[0]).to(x)], dim=1)
+
+        positive_kwargs = get_repeated_kwargs(extra_args['positive'], x.shape[0])
+        negative_kwargs = get_repeated_kwargs(extra_args['negative'], x.shape[0])
 
-        pred_positive = transformer(hidden_states=hidden_states, timestep=timestep, return_dict=False, **extra_args['positive'])[0].float()
+        use_cfg = isinstance(cfg_scale, torch.Tensor) or cfg_scale != 1.0
 
-        if cfg_scale == 1.0:
-            pred_negative = torch.zeros_like(pred_positive)
+        batched_cfg_kwargs = None
+        if use_cfg and extra_args.get('batch_cfg', False):
+            batched_cfg_kwargs = get_batched_cfg_kwargs(extra_args['positive'], extra_args['negative'], x.shape[0])
+
+        if batched_cfg_kwargs is not None:
+            # Both branches in one forward: halves kernel launches and weight streaming per step
+            pred = run_transformer(torch.cat([hidden_states] * 2), torch.cat([timestep] * 2), 'batched', batched_cfg_kwargs, tile_size, tile_overlap)
+            pred_positive, pred_negative = pred.chunk(2, dim=0)
         else:
-            pred_negative = transformer(hidden_states=hidden_states, timestep=timestep, return_dict=False, **extra_args['negative'])[0].float()
+            # Step caches keep separate state per branch, so tag each pass
+            pred_positive = run_transformer(hidden_states, timestep, 'positive', positive_kwargs, tile_size, tile_overlap)
+
+            if not use_cfg:
+                pred_negative = torch.zeros_like(pred_positive)
+            else:
+                pred_negative = run_transformer(hidden_states, timestep, 'negative', negative_kwargs, tile_size, tile_overlap)
 
         pred_cfg = pred_negative + cfg_scale * (pred_positive - pred_negative)
         pred = rescale_noise_cfg(pred_cfg, pred_positive, guidance_rescale=cfg_rescale)
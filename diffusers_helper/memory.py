@@ -81,6 +81,45 @@ def get_cuda_free_memory_gb(device=None):
     return bytes_total_available / (1024 ** 3)
 
 
+def get_module_size_bytes(module: torch.nn.Module):
+    return sum(t.numel() * t.element_size() for t in list(module.parameters()) + list(module.buffers()))
+
+
+def get_device_budget_bytes(device, preserved_memory_gb=0):
+    # CPU placement is bounded by system RAM, which already holds the weights before placement
+    if device.type != 'cuda':
+        return float('inf')
+    return max(get_cuda_free_memory_gb(device) - preserved_memory_gb, 0) * (1024 ** 3)
+
+
+def plan_layer_placement(layer_sizes, device_budgets):
+    """
+    Assigns each layer to a device, keeping the layers in contiguous runs so activations move
+    between devices as few times as possible.
+
+    layer_sizes: bytes of each layer, in execution order.
+    device_budgets: list of (device, budget_bytes) in the order the layers should be filled.
+    Devices are filled greedily: a layer goes to the current device while it fits in its budget,
+    otherwise to the next one. Returns one device per layer, or raises ValueError if the layers do not fit.
+    """
+    placement = []
+    device_index = 0
+    used = 0
+
+    for layer_index, size in enumerate(layer_sizes):
+        while device_index < len(device_budgets) and used + size > device_budgets[device_index][1]:
+            device_index += 1
+            used = 0
+
+        if device_index == len(device_budgets):
+            raise ValueError(f'Layer {layer_index} does not fit in the budgets of {[str(d) for d, _ in device_budgets]}')
+
+        placement.append(device_budgets[device_index][0])
+        used += size
+
+    return placement
+
+
 def move_model_to_device_with_memory_preservation(model, target_device, preserved_memory_gb=0):
     print(f'Moving {model.__class__.__name__} to {target_device} with preserved memory: {preserved_memory_gb} GB')
 
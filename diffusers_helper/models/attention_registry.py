@@ -0,0 +1,187 @@
+import json
+import time
+from pathlib import Path
+
+import torch
+
+
+class AttentionBackend:
+    """
+    A single attention kernel. Both functions take q, k, v in NHD layout (batch, seq, heads, head_dim).
+    dense_fn(q, k, v) attends over the whole sequence.
+    varlen_fn(q, k, v, cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv) attends within cu_seqlens segments.
+    """
+
+    def __init__(self, name, dense_fn=None, varlen_fn=None, device_types=('cuda',)):
+        self.name = name
+        self.dense_fn = dense_fn
+        self.varlen_fn = varlen_fn
+        self.device_types = tuple(device_types)
+
+    def supports(self, kind, device):
+        fn = self.dense_fn if kind == 'dense' else self.varlen_fn
+        return fn is not None and device.type in self.device_types
+
+
+class AttentionBackendRegistry:
+    """
+    Registry of attention backends, dispatched per (kind, sequence length bucket, head dim, dtype, device).
+
+    Backends are tried in registration order, so without autotuning the first available one wins.
+    With autotune enabled, the first call for an unseen key benchmarks every available backend on a
+    short synthetic problem, drops backends that fail the parity check against the reference backend,
+    and persists the fastest one to disk so later runs skip the benchmark.
+    """
+
+    def __init__(self, cache_file, reference='sdpa', parity_tolerance=0.05, max_benchmark_seqlen=8192, benchmark_iters=5):
+        self.cache_file = Path(cache_file)
+        self.reference = reference
+        self.parity_tolerance = parity_tolerance
+        self.max_benchmark_seqlen = max_benchmark_seqlen
+        self.benchmark_iters = benchmark_iters
+
+        self.autotune = False
+        self.backends = {}
+        self.table = None
+
+    def register(self, name, dense_fn=None, varlen_fn=None, device_types=('cuda',)):
+        self.backends[name] = AttentionBackend(name, dense_fn, varlen_fn, device_types)
+        return self.backends[name]
+
+    def available(self, kind, device):
+        return [b for b in self.backends.values() if b.supports(kind, device)]
+
+    @staticmethod
+    def seqlen_bucket(seqlen):
+        # Round up to a power of two so nearby resolutions share one benchmark
+        return 1 << max(int(seqlen) - 1, 1).bit_length()
+
+    @staticmethod
+    def make_key(kind, seqlen, head_dim, dtype, device):
+        device_name = torch.cuda.get_device_name(device) if device.type == 'cuda' else device.type
+        return f"{kind}|{AttentionBackendRegistry.seqlen_bucket(seqlen)}|{head_dim}|{str(dtype).replace('torch.', '')}|{device_name}"
+
+    def _load_table(self):
+        if self.table is not None:
+            return self.table
+
+        self.table = {}
+        if self.cache_file.is_file():
+            try:
+                with open(self.cache_file, 'r') as f:
+                    self.table = json.load(f)
+            except Exception as e:
+                print(f"Could not read attention benchmark cache {self.cache_file}: {e}")
+        return self.table
+
+    def _save_table(self):
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_file, 'w') as f:
+                json.dump(self.table, f, indent=2, sort_keys=True)
+        except Exception as e:
+            print(f"Could not write attention benchmark cache {self.cache_file}: {e}")
+
+    def select(self, kind, seqlen, head_dim, dtype, device):
+        candidates = self.available(kind, device)
+        if not candidates:
+            raise NotImplementedError(f'No attention backend supports {kind} attention on {device.type}!')
+
+        if not self.autotune or len(candidates) == 1:
+            return candidates[0]
+
+        table = self._load_table()
+        key = self.make_key(kind, seqlen, head_dim, dtype, device)
+
+        name = table.get(key)
+        if name not in self.backends or not self.backends[name].supports(kind, device):
+            name = self.benchmark(kind, seqlen, head_dim, dtype, device)
+            table[key] = name
+            self._save_table()
+
+        return self.backends[name]
+
+    def _synthetic_problem(self, kind, seqlen, head_dim, dtype, device):
+        seqlen = min(self.seqlen_bucket(seqlen), self.max_benchmark_seqlen)
+        batch_size = 2 if kind == 'varlen' else 1
+        num_heads = 4
+
+        generator = torch.Generator(device=device).manual_seed(0)
+        q, k, v = [torch.randn((batch_size, seqlen, num_heads, head_dim), generator=generator, device=device, dtype=dtype) for _ in range(3)]
+
+        if kind == 'dense':
+            return (q, k, v), None
+
+        # Mirror get_cu_seqlens: each sample is [valid tokens, padding], with different amounts of padding
+        valid = torch.tensor([seqlen, seqlen * 3 // 4], dtype=torch.int32, device=device)
+        starts = torch.arange(batch_size, dtype=torch.int32, device=device) * seqlen
+        cu_seqlens = torch.zeros([2 * batch_size + 1], dtype=torch.int32, device=device)
+        cu_seqlens[1::2] = starts + valid
+        cu_seqlens[2::2] = starts + seqlen
+        return (q, k, v, cu_seqlens, cu_seqlens, seqlen, seqlen), valid
+
+    @staticmethod
+    def _run(backend, kind, args):
+        fn = backend.dense_fn if kind == 'dense' else backend.varlen_fn
+        return fn(*args)
+
+    @staticmethod
+    def _valid_tokens(x, valid):
+        # Padded query positions are unused by the model, so parity only covers valid tokens
+        if valid is None:
+            return x.float()
+        return torch.cat([x[i, :n] for i, n in enumerate(valid.tolist())]).float()
+
+    def check_parity(self, backend, kind, args, valid, reference_out):
+        out = self._valid_tokens(self._run(backend, kind, args), valid)
+        error = ((out - reference_out).abs().mean() / reference_out.abs().mean().clamp_min(1e-6)).item()
+        return error <= self.parity_tolerance, error
+
+    def _time(self, backend, kind, args, device):
+        self._run(backend, kind, args)  # warmup
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        start = time.perf_counter()
+        for _ in range(self.benchmark_iters):
+            self._run(backend, kind, args)
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        return (time.perf_counter() - start) / self.benchmark_iters
+
+    @torch.no_grad()
+    def benchmark(self, kind, seqlen, head_dim, dtype, device):
+        candidates = self.available(kind, device)
+        args, valid = self._synthetic_problem(kind, seqlen, head_dim, dtype, device)
+
+        reference = self.backends.get(self.reference)
+        reference_out = None
+        if reference is not None and reference.supports(kind, device):
+            reference_out = self._valid_tokens(self._run(reference, kind, args), valid)
+
+        best_name, best_time = candidates[0].name, float('inf')
+        for backend in candidates:
+            try:
+                if reference_out is not None and backend is not reference:
+                    ok, error = self.check_parity(backend, kind, args, valid, reference_out)
+                    if not ok:
+                        print(f"Attention backend {backend.name} failed parity check ({error:.4f}), skipping.")
+                        continue
+                elapsed = self._time(backend, kind, args, device)
+            except Exception as e:
+                print(f"Attention backend {backend.name} failed during benchmark: {e}")
+                continue
+
+            print(f"Attention benchmark {kind} seq={args[0].shape[1]} head_dim={head_dim} {backend.name}: {elapsed * 1000:.3f} ms")
+            if elapsed < best_time:
+                best_name, best_time = backend.name, elapsed
+
+        print(f"Selected attention backend {best_name} for {self.make_key(kind, seqlen, head_dim, dtype, device)}")
+        return best_name
+
+    def dense(self, q, k, v):
+        backend = self.select('dense', q.shape[1], q.shape[-1], q.dtype, q.device)
+        return backend.dense_fn(q, k, v)
+
+    def varlen(self, q, k, v, cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv):
+        backend = self.select('varlen', max_seqlen_q, q.shape[-1], q.dtype, q.device)
+        return backend.varlen_fn(q, k, v, cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv)
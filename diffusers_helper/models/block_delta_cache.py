@@ -0,0 +1,131 @@
+import torch
+
+from diffusers_helper.models.cache_branches import CacheBranchState
+
+
+class BlockDeltaCache:
+    """
+    Per-block residual caching for skipping individual transformer blocks during video generation.
+    Every fully computed block stores its output residual (output minus input). When a block's
+    residual barely changed between its last two computed steps, the following steps reuse the
+    stored residual instead of running the block, until the accumulated estimated change reaches
+    the threshold. Unlike TeaCache, MagCache and First Block Cache, stable blocks are skipped on
+    their own while the rest of the model is still computed.
+
+    Stored residuals cost one activation per cached block (and per CFG branch), so only blocks from
+    first_cached_block onwards (counting dual-stream blocks first) are considered.
+    """
+
+    def __init__(self, num_steps, num_blocks, is_enabled=True, threshold=0.05, max_consecutive_skips=2, retention_ratio=0.2, first_cached_block=0):
+        self.num_steps = num_steps
+        self.num_blocks = num_blocks
+
+        self.is_enabled = is_enabled
+
+        self.threshold = threshold
+        self.max_consecutive_skips = max_consecutive_skips
+        self.retention_ratio = retention_ratio
+        self.first_cached_block = first_cached_block
+
+        # total cache statistics for all sections in the entire generation
+        self.total_block_requests = 0
+        self.total_block_hits = 0
+
+        self._init_for_every_section()
+
+        self.branch_state = CacheBranchState(self, [
+            'step_index', 'skipping_allowed', 'block_skips_list', 'consecutive_skips', 'accumulated_change',
+            'last_change', 'pending_changes', 'previous_residuals',
+        ])
+
+    def select_branch(self, branch):
+        """
+        Switches to the per-step state of the given CFG branch, so each branch skips independently.
+        """
+        self.branch_state.select(branch)
+
+    def _init_for_every_section(self):
+        self.step_index = 0
+        self.skipping_allowed = False
+        self.block_skips_list = []
+        self.consecutive_skips = [0] * self.num_blocks
+        self.accumulated_change = [0.0] * self.num_blocks
+        self.last_change = [None] * self.num_blocks
+        self.pending_changes = {}
+        self.previous_residuals = [None] * self.num_blocks
+
+    def begin_step(self):
+        """
+        Expected to be called once per step, before the first transformer block runs.
+        """
+        if self.step_index == 0 or self.step_index >= self.num_steps:
+            self._init_for_every_section()
+
+        # Residual changes measured during the last step are read back in one sync here
+        if self.pending_changes:
+            block_ids = list(self.pending_changes.keys())
+            changes = torch.stack([self.pending_changes[i].float().cpu() for i in block_ids]).tolist()
+            for block_id, change in zip(block_ids, changes):
+                self.last_change[block_id] = change
+            self.pending_changes = {}
+
+        self.skipping_allowed = (self.step_index >= max(int(self.retention_ratio * self.num_steps), 1)
+                                 and self.step_index < self.num_steps - 1)  # always compute the final step
+        self.block_skips_list.append(0)
+
+        # Increment for next step
+        self.step_index += 1
+        if self.step_index == self.num_steps:
+            self.step_index = 0
+
+    def should_skip(self, block_id):
+        """
+        Returns True if the block should be replaced with apply_cached_residual() on this step.
+        """
+        if block_id < self.first_cached_block:
+            return False
+        self.total_block_requests += 1
+
+        change = self.last_change[block_id]
+        should_skip_block = (self.skipping_allowed
+                             and self.previous_residuals[block_id] is not None
+                             and change is not None
+                             and self.consecutive_skips[block_id] < self.max_consecutive_skips
+                             and self.accumulated_change[block_id] + change < self.threshold)
+
+        if should_skip_block:
+            self.total_block_hits += 1
+            self.consecutive_skips[block_id] += 1
+            self.accumulated_change[block_id] += change
+            self.block_skips_list[-1] += 1
+
+        return should_skip_block
+
+    def apply_cached_residual(self, block_id, hidden_states, encoder_hidden_states):
+        """
+        Should be called if and only if should_skip() returned True for the block on this step.
+        """
+        residual, encoder_residual = self.previous_residuals[block_id]
+        return hidden_states + residual, encoder_hidden_states + encoder_residual
+
+    def update(self, block_id, inputs, outputs):
+        """
+        Stores the residual of a block that was computed on this step, and measures its relative change.
+
+        Args:
+            inputs: (hidden_states, encoder_hidden_states) passed to the block.
+            outputs: (hidden_states, encoder_hidden_states) returned by the block.
+        """
+        if block_id < self.first_cached_block:
+            return
+
+        residual = outputs[0] - inputs[0]
+        encoder_residual = outputs[1] - inputs[1]
+
+        previous = self.previous_residuals[block_id]
+        if previous is not None and previous[0].shape == residual.shape:
+            self.pending_changes[block_id] = (residual - previous[0]).abs().mean() / previous[0].abs().mean().clamp_min(1e-6)
+
+        self.previous_residuals[block_id] = (residual, encoder_residual)
+        self.consecutive_skips[block_id] = 0
+        self.accumulated_change[block_id] = 0.0
@@ -0,0 +1,39 @@
+import copy
+
+
+class CacheBranchState:
+    """
+    Keeps a separate copy of a step cache's per-step attributes for each CFG branch.
+    With real CFG the transformer is called once per branch on every step. Without this,
+    the positive and negative passes would overwrite each other's residuals, counters
+    and skip decisions. Selecting a branch swaps its attributes into the owner object.
+    """
+
+    def __init__(self, owner, attr_names, branch='positive'):
+        self.owner = owner
+        self.attr_names = list(attr_names)
+        self.branch = branch
+        self.states = {}
+        # Snapshot of the freshly initialized attributes, used to start new branches
+        self.initial_state = {name: copy.copy(getattr(owner, name)) for name in self.attr_names}
+
+    def select(self, branch):
+        if branch == self.branch:
+            return
+
+        self.states[self.branch] = {name: getattr(self.owner, name) for name in self.attr_names}
+
+        state = self.states.pop(branch, None)
+        if state is None:
+            state = {name: copy.copy(value) for name, value in self.initial_state.items()}
+
+        for name, value in state.items():
+            setattr(self.owner, name, value)
+
+        self.branch = branch
+
+    def reset(self):
+        """Discards the state of every branch, so all of them start over from the initial state."""
+        self.states = {}
+        for name, value in self.initial_state.items():
+            setattr(self.owner, name, copy.copy(value))
@@ -0,0 +1,105 @@
+from diffusers_helper.models.cache_branches import CacheBranchState
+
+
+class FirstBlockCache:
+    """
+    Implements First Block Cache for skipping transformer steps during video generation.
+    Every step runs the first double-stream block. If its residual changed little relative to the
+    last fully computed step, the residual of the remaining blocks from that step is reused.
+    Based on the first-block cache in ParaAttention (https://github.com/chengzeyi/ParaAttention).
+    Unlike MagCache, no calibration table is needed, so it works at any resolution and step count.
+    """
+
+    def __init__(self, num_steps, is_enabled=True, threshold=0.08, max_consecutive_skips=3, retention_ratio=0.2):
+        self.num_steps = num_steps
+
+        self.is_enabled = is_enabled
+
+        self.threshold = threshold
+        self.max_consecutive_skips = max_consecutive_skips
+        self.retention_ratio = retention_ratio
+
+        # total cache statistics for all sections in the entire generation
+        self.total_cache_requests = 0
+        self.total_cache_hits = 0
+
+        self._init_for_every_section()
+
+        self.branch_state = CacheBranchState(self, [
+            'step_index', 'steps_skipped_list', 'consecutive_skips', 'previous_first_block_residual', 'previous_residual',
+        ])
+
+    def select_branch(self, branch):
+        """
+        Switches to the per-step state of the given CFG branch, so each branch skips independently.
+        """
+        self.branch_state.select(branch)
+
+    def _init_for_every_section(self):
+        self.step_index = 0
+        self.steps_skipped_list = []
+        self.consecutive_skips = 0
+
+        self.previous_first_block_residual = None
+        self.previous_residual = None
+
+    def should_skip(self, first_block_residual):
+        """
+        Expected to be called once per step, after the first transformer block has run.
+        If the step is skipped, the remaining blocks should be replaced with estimate_predicted_hidden_states().
+
+        Args:
+            first_block_residual: Output minus input of the first transformer block for the current step.
+        Returns:
+            True if the step should be skipped, False otherwise
+        """
+        if self.step_index == 0 or self.step_index >= self.num_steps:
+            self._init_for_every_section()
+        self.total_cache_requests += 1
+
+        should_skip_forward = False
+        if (self.previous_residual is not None
+                and self.step_index >= max(int(self.retention_ratio * self.num_steps), 1)
+                and self.step_index < self.num_steps - 1  # always compute the final step
+                and self.consecutive_skips < self.max_consecutive_skips):
+            previous = self.previous_first_block_residual
+            relative_change = ((first_block_residual - previous).abs().mean() / previous.abs().mean()).item()
+            should_skip_forward = relative_change < self.threshold
+
+        if should_skip_forward:
+            self.total_cache_hits += 1
+            self.consecutive_skips += 1
+            self.steps_skipped_list.append(self.step_index)
+        else:
+            # Skips are always measured against the last fully computed step
+            self.consecutive_skips = 0
+            self.previous_first_block_residual = first_block_residual
+
+        # Increment for next step
+        self.step_index += 1
+        if self.step_index == self.num_steps:
+            self.step_index = 0
+
+        return should_skip_forward
+
+    def estimate_predicted_hidden_states(self, hidden_states):
+        """
+        Should be called if and only if should_skip() returned True for the current step.
+
+        Args:
+            hidden_states: The hidden states tensor output from the first transformer block.
+        Returns:
+            The estimated output of the remaining transformer blocks.
+        """
+        return hidden_states + self.previous_residual
+
+    def update_hidden_states(self, first_block_hidden_states, model_prediction_hidden_states):
+        """
+        If and only if should_skip() returned False for the current step, the remaining layers should have been run,
+        and this function should be called to store their residual for future steps.
+
+        Args:
+            first_block_hidden_states: The hidden states tensor output from the first transformer block.
+            model_prediction_hidden_states: The hidden states tensor output from the remaining transformer blocks.
+        """
+        self.previous_residual = model_prediction_hidden_states - first_block_hidden_states
@@ -1,3 +1,7 @@
+import math
+import contextlib
+from collections import OrderedDict
+from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 import torch
@@ -15,7 +19,12 @@ from diffusers.models.embeddings import TimestepEmbedding, Timesteps, PixArtAlph
 from diffusers.models.modeling_outputs import Transformer2DModelOutput
 from diffusers.models.modeling_utils import ModelMixin
 from diffusers_helper.dit_common import LayerNorm
+from diffusers_helper.models.attention_registry import AttentionBackendRegistry
+from diffusers_helper.models.cache_branches import CacheBranchState
+from diffusers_helper.models.first_block_cache import FirstBlockCache
+from diffusers_helper.models.block_delta_cache import BlockDeltaCache
 from diffusers_helper.models.mag_cache import MagCache
+from diffusers_helper.models.quantized_linear import WeightOnlyQuantLinear, replace_linear_layers
 from diffusers_helper.utils import zero_module
 
 
@@ -108,23 +117,108 @@ def center_down_sample_3d(x, kernel_size):
     return torch.nn.functional.avg_pool3d(x, kernel_size, stride=kernel_size)
 
 
+def move_to_device(x, device):
+    # Moves tensors inside (nested) tuples, leaving None and non-tensor values untouched
+    if isinstance(x, torch.Tensor):
+        return x.to(device)
+    if isinstance(x, tuple):
+        return tuple(move_to_device(v, device) for v in x)
+    return x
+
+
+def chunked_feed_forward(ff, x, chunk_size):
+    # Feed-forward layers act on each token independently, so splitting along the sequence
+    # gives the same result while only one chunk's expanded activation exists at a time
+    if not chunk_size or x.shape[1] <= chunk_size:
+        return ff(x)
+    return torch.cat([ff(chunk) for chunk in x.split(chunk_size, dim=1)], dim=1)
+
+
+def clean_latent_token_count(num_frames, height, width, factor):
+    # Tokens produced by a clean_x_embedder projection that downsamples time and space by `factor`
+    # (height and width are already patchified)
+    return math.ceil(num_frames / factor) * math.ceil(height / factor) * math.ceil(width / factor)
+
+
+def fit_clean_latents_to_budget(
+        token_budget, num_noisy_tokens, height, width, latent_indices,
+        clean_latents=None, clean_latent_indices=None,
+        clean_latents_2x=None, clean_latent_2x_indices=None,
+        clean_latents_4x=None, clean_latent_4x_indices=None
+):
+    """
+    Drops clean-latent frames farthest from the noisy window until the packed sequence fits in token_budget.
+    The 4x history goes first, then the 2x history, in whole downsampling groups (4 or 2 frames).
+    The 1x context (start/end frames and the most recent history) is never dropped.
+    Returns the clean inputs in the same order as the arguments.
+    """
+    noisy_position = latent_indices.float().mean() if latent_indices is not None else 0.0
+
+    def count(latents, factor):
+        return clean_latent_token_count(latents.shape[2], height, width, factor) if latents is not None else 0
+
+    total = num_noisy_tokens + count(clean_latents, 1) + count(clean_latents_2x, 2) + count(clean_latents_4x, 4)
+    dropped = {2: 0, 4: 0}
+
+    def drop(latents, indices, factor):
+        nonlocal total
+        while total > token_budget and latents is not None:
+            num_frames = latents.shape[2]
+            n = min(factor, num_frames)
+            if n == num_frames:
+                latents, indices = None, None
+            elif indices.float().mean() < noisy_position:
+                # History lies before the noisy window (F1): the oldest frames are first
+                latents, indices = latents[:, :, n:], indices[:, n:]
+            else:
+                # History lies after the noisy window (backward generation): the farthest frames are last
+                latents, indices = latents[:, :, :-n], indices[:, :-n]
+            total = total - clean_latent_token_count(num_frames, height, width, factor) + count(latents, factor)
+            dropped[factor] += n
+        return latents, indices
+
+    if clean_latent_4x_indices is not None:
+        clean_latents_4x, clean_latent_4x_indices = drop(clean_latents_4x, clean_latent_4x_indices, 4)
+    if clean_latent_2x_indices is not None:
+        clean_latents_2x, clean_latent_2x_indices = drop(clean_latents_2x, clean_latent_2x_indices, 2)
+
+    if dropped[2] or dropped[4]:
+        print(f'Context token budget {token_budget}: dropped {dropped[4]} 4x and {dropped[2]} 2x clean latent frames, {total} tokens remain')
+
+    return clean_latents, clean_latent_indices, clean_latents_2x, clean_latent_2x_indices, clean_latents_4x, clean_latent_4x_indices
+
+
 def get_cu_seqlens(text_mask, img_len):
+    # Each sample contributes two segments: [img + valid text] and [padded text]
     batch_size = text_mask.shape[0]
-    text_len = text_mask.sum(dim=1)
+    text_len = text_mask.sum(dim=1).to(torch.int32)
     max_len = text_mask.shape[1] + img_len
 
-    cu_seqlens = torch.zeros([2 * batch_size + 1], dtype=torch.int32, device="cuda")
+    starts = torch.arange(batch_size, dtype=torch.int32, device=text_mask.device) * max_len
 
-    for i in range(batch_size):
-        s = text_len[i] + img_len
-        s1 = i * max_len + s
-        s2 = (i + 1) * max_len
-        cu_seqlens[2 * i + 1] = s1
-        cu_seqlens[2 * i + 2] = s2
+    cu_seqlens = torch.zeros([2 * batch_size + 1], dtype=torch.int32, device=text_mask.device)
+    cu_seqlens[1::2] = starts + text_len + img_len
+    cu_seqlens[2::2] = starts + max_len
 
     return cu_seqlens
 
 
+def get_key_padding_mask(cu_seqlens_kv, max_seqlen_kv, device):
+    # (batch, max_seqlen_kv) bool mask of the valid keys for the layout built by get_cu_seqlens
+    valid_len = cu_seqlens_kv[1::2] - cu_seqlens_kv[0:-1:2]
+    positions = torch.arange(max_seqlen_kv, device=device)
+    return positions[None, :] < valid_len[:, None].to(device)
+
+
+def sdpa_varlen_func(q, k, v, cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv):
+    # Masked SDPA equivalent of varlen attention for the layout built by get_cu_seqlens.
+    # Keys in the padded text segment are masked out. Queries in that segment attend to the
+    # valid tokens instead of to each other, but their outputs are never read by valid tokens.
+    key_mask = get_key_padding_mask(cu_seqlens_kv, max_seqlen_kv, q.device)[:, None, None, :]
+    x = torch.nn.functional.scaled_dot_product_attention(q.transpose(1, 2), k.transpose(1, 2), v.transpose(1, 2), attn_mask=key_mask).transpose(1, 2)
+    return x
+
+
 def apply_rotary_emb_transposed(x, freqs_cis):
     cos, sin = freqs_cis.unsqueeze(-2).chunk(2, dim=-1)
     x_real, x_imag = x.unflatten(-1, (-1, 2)).unbind(-1)
@@ -134,44 +228,207 @@ def apply_rotary_emb_transposed(x, freqs_cis):
     return out
 
 
+def sage_varlen_func(q, k, v, cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv):
+    batch_size = q.shape[0]
+    x = sageattn_varlen(q.flatten(0, 1), k.flatten(0, 1), v.flatten(0, 1), cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv)
+    return x.view(batch_size, max_seqlen_q, *x.shape[1:])
+
+
+def flash_varlen_func(q, k, v, cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv):
+    batch_size = q.shape[0]
+    x = flash_attn_varlen_func(q.flatten(0, 1), k.flatten(0, 1), v.flatten(0, 1), cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv)
+    return x.view(batch_size, max_seqlen_q, *x.shape[1:])
+
+
+def sdpa_func(q, k, v):
+    return torch.nn.functional.scaled_dot_product_attention(q.transpose(1, 2), k.transpose(1, 2), v.transpose(1, 2)).transpose(1, 2)
+
+
+# Registration order is the default priority when autotuning is off
+attention_registry = AttentionBackendRegistry(Path(__file__).resolve().parents[2] / ".framepack" / "attention_backends.json")
+
+if sageattn is not None:
+    attention_registry.register('sage', dense_fn=lambda q, k, v: sageattn(q, k, v, tensor_layout='NHD'), varlen_fn=sage_varlen_func if sageattn_varlen is not None else None)
+
+if flash_attn_func is not None:
+    attention_registry.register('flash', dense_fn=flash_attn_func, varlen_fn=flash_varlen_func if flash_attn_varlen_func is not None else None)
+
+if xformers_attn_func is not None:
+    attention_registry.register('xformers', dense_fn=xformers_attn_func)
+
+attention_registry.register('sdpa', dense_fn=sdpa_func, varlen_fn=sdpa_varlen_func, device_types=('cuda', 'cpu', 'mps', 'xpu'))
+
+
+# Kept out of torch.compile graphs: external kernels and backend autotuning run eagerly
+@torch.compiler.disable
 def attn_varlen_func(q, k, v, cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv):
     if cu_seqlens_q is None and cu_seqlens_kv is None and max_seqlen_q is None and max_seqlen_kv is None:
-        if sageattn is not None:
-            x = sageattn(q, k, v, tensor_layout='NHD')
-            return x
+        return attention_registry.dense(q, k, v)
+
+    return attention_registry.varlen(q, k, v, cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv)
+
+
+def build_sparse_context_plan(context_lengths, num_noisy_tokens, stride, device):
+    """
+    Index plan for temporally local attention in the single-stream blocks.
+    The packed sequence is [4x, 2x, 1x, noisy, text]. Noisy queries attend to every stride-th 2x/4x
+    context token and to all 1x, noisy and text tokens; every other query keeps full attention.
+    Returns (context_index, dense_start, noisy_start, noisy_end), or None if there is nothing to thin out.
+    """
+    num_4x, num_2x, num_1x = context_lengths
+    if not stride or stride <= 1 or num_4x + num_2x == 0:
+        return None
+
+    dense_start = num_4x + num_2x
+    context_index = torch.cat([
+        torch.arange(0, num_4x, stride, device=device),
+        torch.arange(num_4x, dense_start, stride, device=device),
+    ])
+    noisy_start = dense_start + num_1x
+    return context_index, dense_start, noisy_start, noisy_start + num_noisy_tokens
+
+
+def sparse_context_attention_mask(plan, seq_len, device):
+    """
+    The plan as a dense (seq_len, seq_len) bool SDPA mask, for checking sparse_context_attn_func against.
+    """
+    context_index, dense_start, noisy_start, noisy_end = plan
+    mask = torch.ones((seq_len, seq_len), dtype=torch.bool, device=device)
+    mask[noisy_start:noisy_end, :dense_start] = False
+    mask[noisy_start:noisy_end, context_index.to(device)] = True
+    return mask
+
+
+def _masked_sdpa(q, k, v, key_mask):
+    return torch.nn.functional.scaled_dot_product_attention(q.transpose(1, 2), k.transpose(1, 2), v.transpose(1, 2), attn_mask=key_mask[:, None, None, :]).transpose(1, 2)
+
+
+@torch.compiler.disable
+def sparse_context_attn_func(q, k, v, plan, cu_seqlens_kv, max_seqlen_kv):
+    """
+    Attention following a build_sparse_context_plan plan. Instead of masking, the noisy queries run
+    against a gathered subset of the keys, so the skipped 2x/4x context costs no FLOPs.
+    Equivalent to SDPA with sparse_context_attention_mask (plus key padding when batched).
+    """
+    context_index, dense_start, noisy_start, noisy_end = plan
+
+    sparse_k = torch.cat([k[:, context_index], k[:, dense_start:]], dim=1)
+    sparse_v = torch.cat([v[:, context_index], v[:, dense_start:]], dim=1)
+    noisy_q = q[:, noisy_start:noisy_end]
+    other_q = torch.cat([q[:, :noisy_start], q[:, noisy_end:]], dim=1)
+
+    if cu_seqlens_kv is None:
+        noisy = attention_registry.dense(noisy_q, sparse_k, sparse_v)
+        other = attention_registry.dense(other_q, k, v)
+    else:
+        key_mask = get_key_padding_mask(cu_seqlens_kv, max_seqlen_kv, q.device)
+        sparse_key_mask = torch.cat([key_mask[:, context_index], key_mask[:, dense_start:]], dim=1)
+        noisy = _masked_sdpa(noisy_q, sparse_k, sparse_v, sparse_key_mask)
+        other = _masked_sdpa(other_q, k, v, key_mask)
 
-        if flash_attn_func is not None:
-            x = flash_attn_func(q, k, v)
-            return x
+    return torch.cat([other[:, :noisy_start], noisy, other[:, noisy_start:]], dim=1)
 
-        if xformers_attn_func is not None:
-            x = xformers_attn_func(q, k, v)
-            return x
 
-        x = torch.nn.functional.scaled_dot_product_attention(q.transpose(1, 2), k.transpose(1, 2), v.transpose(1, 2)).transpose(1, 2)
-        return x
+@torch.no_grad()
+def fuse_linear_layers(linears):
+    """
+    Concatenates the weights of several linear layers sharing an input into one layer.
+    The source layers give up their parameters (set to None) so weights are not held twice.
+    """
+    weight = torch.cat([l.weight.data for l in linears], dim=0)
+    has_bias = all(l.bias is not None for l in linears)
+
+    fused = nn.Linear(weight.shape[1], weight.shape[0], bias=has_bias, device='meta', dtype=weight.dtype)
+    fused.weight = nn.Parameter(weight, requires_grad=False)
+    if has_bias:
+        fused.bias = nn.Parameter(torch.cat([l.bias.data for l in linears], dim=0), requires_grad=False)
+
+    for l in linears:
+        l.weight = None
+        l.bias = None
+
+    return fused
+
+
+@torch.no_grad()
+def unfuse_linear_layers(fused, linears):
+    """
+    Inverse of fuse_linear_layers: splits the fused weights back into the original layer objects.
+    """
+    sizes = [l.out_features for l in linears]
+    weights = fused.weight.data.split(sizes, dim=0)
+    biases = fused.bias.data.split(sizes, dim=0) if fused.bias is not None else [None] * len(linears)
+
+    for l, w, b in zip(linears, weights, biases):
+        l.weight = nn.Parameter(w.clone(), requires_grad=False)
+        l.bias = nn.Parameter(b.clone(), requires_grad=False) if b is not None else None
 
-    batch_size = q.shape[0]
-    q = q.view(q.shape[0] * q.shape[1], *q.shape[2:])
-    k = k.view(k.shape[0] * k.shape[1], *k.shape[2:])
-    v = v.view(v.shape[0] * v.shape[1], *v.shape[2:])
-    if sageattn_varlen is not None:
-        x = sageattn_varlen(q, k, v, cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv)
-    elif flash_attn_varlen_func is not None:
-        x = flash_attn_varlen_func(q, k, v, cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv)
-    else:
-        raise NotImplementedError('No Attn Installed!')
-    x = x.view(batch_size, max_seqlen_q, *x.shape[2:])
-    return x
+
+def fuse_attention_projections(attn):
+    if attn.fused_projections:
+        return
+    attn.to_qkv = fuse_linear_layers([attn.to_q, attn.to_k, attn.to_v])
+    if getattr(attn, 'add_q_proj', None) is not None:
+        attn.to_added_qkv = fuse_linear_layers([attn.add_q_proj, attn.add_k_proj, attn.add_v_proj])
+    attn.fused_projections = True
+
+
+def unfuse_attention_projections(attn):
+    if not attn.fused_projections:
+        return
+    unfuse_linear_layers(attn.to_qkv, [attn.to_q, attn.to_k, attn.to_v])
+    del attn.to_qkv
+    if getattr(attn, 'to_added_qkv', None) is not None:
+        unfuse_linear_layers(attn.to_added_qkv, [attn.add_q_proj, attn.add_k_proj, attn.add_v_proj])
+        del attn.to_added_qkv
+    attn.fused_projections = False
+
+
+class SectionConditioningCache:
+    """
+    Holds conditioning that stays constant across the denoising steps of a section
+    (clean latent embeddings, their RoPE frequencies, image projection).
+    Entries are reused as long as the exact same input tensors are passed in.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    @staticmethod
+    def _same_inputs(a, b):
+        if len(a) != len(b):
+            return False
+        for x, y in zip(a, b):
+            if isinstance(x, torch.Tensor) or isinstance(y, torch.Tensor):
+                if x is not y:
+                    return False
+            elif x != y:
+                return False
+        return True
+
+    def get(self, name, inputs, compute_fn):
+        entry = self.entries.get(name)
+        if entry is not None and self._same_inputs(entry[0], inputs):
+            return entry[1]
+        result = compute_fn()
+        self.entries[name] = (inputs, result)
+        return result
+
+    def clear(self):
+        self.entries.clear()
 
 
 class HunyuanAttnProcessorFlashAttnDouble:
     def __call__(self, attn, hidden_states, encoder_hidden_states, attention_mask, image_rotary_emb):
-        cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv = attention_mask
+        # The sparse context plan (5th entry) only applies to the single-stream blocks
+        cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv = attention_mask[:4]
 
-        query = attn.to_q(hidden_states)
-        key = attn.to_k(hidden_states)
-        value = attn.to_v(hidden_states)
+        if attn.fused_projections:
+            query, key, value = attn.to_qkv(hidden_states).chunk(3, dim=-1)
+        else:
+            query = attn.to_q(hidden_states)
+            key = attn.to_k(hidden_states)
+            value = attn.to_v(hidden_states)
 
         query = query.unflatten(2, (attn.heads, -1))
         key = key.unflatten(2, (attn.heads, -1))
@@ -183,9 +440,12 @@ class HunyuanAttnProcessorFlashAttnDouble:
         query = apply_rotary_emb_transposed(query, image_rotary_emb)
         key = apply_rotary_emb_transposed(key, image_rotary_emb)
 
-        encoder_query = attn.add_q_proj(encoder_hidden_states)
-        encoder_key = attn.add_k_proj(encoder_hidden_states)
-        encoder_value = attn.add_v_proj(encoder_hidden_states)
+        if attn.fused_projections:
+            encoder_query, encoder_key, encoder_value = attn.to_added_qkv(encoder_hidden_states).chunk(3, dim=-1)
+        else:
+            encoder_query = attn.add_q_proj(encoder_hidden_states)
+            encoder_key = attn.add_k_proj(encoder_hidden_states)
+            encoder_value = attn.add_v_proj(encoder_hidden_states)
 
         encoder_query = encoder_query.unflatten(2, (attn.heads, -1))
         encoder_key = encoder_key.unflatten(2, (attn.heads, -1))
@@ -213,13 +473,16 @@ class HunyuanAttnProcessorFlashAttnDouble:
 
 class HunyuanAttnProcessorFlashAttnSingle:
     def __call__(self, attn, hidden_states, encoder_hidden_states, attention_mask, image_rotary_emb):
-        cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv = attention_mask
+        cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv, sparse_context_plan = attention_mask
 
         hidden_states = torch.cat([hidden_states, encoder_hidden_states], dim=1)
 
-        query = attn.to_q(hidden_states)
-        key = attn.to_k(hidden_states)
-        value = attn.to_v(hidden_states)
+        if attn.fused_projections:
+            query, key, value = attn.to_qkv(hidden_states).chunk(3, dim=-1)
+        else:
+            query = attn.to_q(hidden_states)
+            key = attn.to_k(hidden_states)
+            value = attn.to_v(hidden_states)
 
         query = query.unflatten(2, (attn.heads, -1))
         key = key.unflatten(2, (attn.heads, -1))
@@ -233,7 +496,10 @@ class HunyuanAttnProcessorFlashAttnSingle:
         query = torch.cat([apply_rotary_emb_transposed(query[:, :-txt_length], image_rotary_emb), query[:, -txt_length:]], dim=1)
         key = torch.cat([apply_rotary_emb_transposed(key[:, :-txt_length], image_rotary_emb), key[:, -txt_length:]], dim=1)
 
-        hidden_states = attn_varlen_func(query, key, value, cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv)
+        if sparse_context_plan is not None:
+            hidden_states = sparse_context_attn_func(query, key, value, sparse_context_plan, cu_seqlens_kv, max_seqlen_kv)
+        else:
+            hidden_states = attn_varlen_func(query, key, value, cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv)
         hidden_states = hidden_states.flatten(-2)
 
         hidden_states, encoder_hidden_states = hidden_states[:, :-txt_length], hidden_states[:, -txt_length:]
@@ -448,11 +714,21 @@ class HunyuanVideoTokenRefiner(nn.Module):
 
 
 class HunyuanVideoRotaryPosEmbed(nn.Module):
+    # LRU of computed cos/sin tables, shared by all instances so it survives model reloads between jobs.
+    # Keyed by (frame_indices, height, width, offset, device, dtype, rope config); values are never modified in place.
+    # Host indices are keyed by value; device indices by storage, since reading them back would sync every forward.
+    freqs_cache = OrderedDict()
+    freqs_cache_size = 16
+
     def __init__(self, rope_dim, theta):
         super().__init__()
         self.DT, self.DY, self.DX = rope_dim
         self.theta = theta
 
+    @classmethod
+    def clear_cache(cls):
+        cls.freqs_cache.clear()
+
     @torch.no_grad()
     def get_frequency(self, dim, pos):
         T, H, W = pos.shape
@@ -461,11 +737,13 @@ class HunyuanVideoRotaryPosEmbed(nn.Module):
         return freqs.cos(), freqs.sin()
 
     @torch.no_grad()
-    def forward_inner(self, frame_indices, height, width, device):
+    def forward_inner(self, frame_indices, height, width, device, offset=(0, 0)):
+        # offset is the (y, x) position of the grid's top-left token, for spatial tiles of a larger frame
+        offset_y, offset_x = offset
         GT, GY, GX = torch.meshgrid(
             frame_indices.to(device=device, dtype=torch.float32),
-            torch.arange(0, height, device=device, dtype=torch.float32),
-            torch.arange(0, width, device=device, dtype=torch.float32),
+            torch.arange(offset_y, offset_y + height, device=device, dtype=torch.float32),
+            torch.arange(offset_x, offset_x + width, device=device, dtype=torch.float32),
             indexing="ij"
         )
 
@@ -477,10 +755,33 @@ class HunyuanVideoRotaryPosEmbed(nn.Module):
 
         return result.to(device)
 
+    @staticmethod
+    def frame_indices_key(frame_indices):
+        if frame_indices.device.type == 'cpu':
+            return tuple(frame_indices.tolist())
+        # The cache entry keeps the tensor alive, so its storage cannot be reused for other indices while cached
+        return ('storage', frame_indices.data_ptr(), frame_indices._version, tuple(frame_indices.shape), frame_indices.stride())
+
     @torch.no_grad()
-    def forward(self, frame_indices, height, width, device):
+    def forward_inner_cached(self, frame_indices, height, width, device, offset=(0, 0)):
+        device = torch.device(device)
+        key = (self.frame_indices_key(frame_indices), height, width, tuple(offset), device, torch.float32, self.DT, self.DY, self.DX, self.theta)
+
+        entry = self.freqs_cache.get(key)
+        if entry is not None:
+            self.freqs_cache.move_to_end(key)
+            return entry[0]
+
+        result = self.forward_inner(frame_indices, height, width, device, offset)
+        self.freqs_cache[key] = (result, frame_indices)
+        while len(self.freqs_cache) > self.freqs_cache_size:
+            self.freqs_cache.popitem(last=False)
+        return result
+
+    @torch.no_grad()
+    def forward(self, frame_indices, height, width, device, offset=(0, 0)):
         frame_indices = frame_indices.unbind(0)
-        results = [self.forward_inner(f, height, width, device) for f in frame_indices]
+        results = [self.forward_inner_cached(f, height, width, device, offset) for f in frame_indices]
         results = torch.stack(results, dim=0)
         return results
 
@@ -587,6 +888,11 @@ class HunyuanVideoSingleTransformerBlock(nn.Module):
         self.act_mlp = nn.GELU(approximate="tanh")
         self.proj_out = nn.Linear(hidden_size + mlp_dim, hidden_size)
 
+        self.ff_chunk_size = None
+
+    def mlp_and_output_projection(self, attn_output, norm_hidden_states):
+        return self.proj_out(torch.cat([attn_output, self.act_mlp(self.proj_mlp(norm_hidden_states))], dim=2))
+
     def forward(
         self,
         hidden_states: torch.Tensor,
@@ -602,7 +908,10 @@ class HunyuanVideoSingleTransformerBlock(nn.Module):
 
         # 1. Input normalization
         norm_hidden_states, gate = self.norm(hidden_states, emb=temb)
-        mlp_hidden_states = self.act_mlp(self.proj_mlp(norm_hidden_states))
+        full_norm_hidden_states = norm_hidden_states
+
+        if not self.ff_chunk_size:
+            mlp_hidden_states = self.act_mlp(self.proj_mlp(norm_hidden_states))
 
         norm_hidden_states, norm_encoder_hidden_states = (
             norm_hidden_states[:, :-text_seq_length, :],
@@ -619,8 +928,16 @@ class HunyuanVideoSingleTransformerBlock(nn.Module):
         attn_output = torch.cat([attn_output, context_attn_output], dim=1)
 
         # 3. Modulation and residual connection
-        hidden_states = torch.cat([attn_output, mlp_hidden_states], dim=2)
-        hidden_states = gate * self.proj_out(hidden_states)
+        if self.ff_chunk_size:
+            # The 4x wide MLP activation is built one sequence chunk at a time, right before projection
+            hidden_states = torch.cat([
+                self.mlp_and_output_projection(attn_chunk, norm_chunk)
+                for attn_chunk, norm_chunk in zip(attn_output.split(self.ff_chunk_size, dim=1), full_norm_hidden_states.split(self.ff_chunk_size, dim=1))
+            ], dim=1)
+        else:
+            hidden_states = torch.cat([attn_output, mlp_hidden_states], dim=2)
+            hidden_states = self.proj_out(hidden_states)
+        hidden_states = gate * hidden_states
         hidden_states = hidden_states + residual
 
         hidden_states, encoder_hidden_states = (
@@ -665,6 +982,8 @@ class HunyuanVideoTransformerBlock(nn.Module):
         self.norm2_context = LayerNorm(hidden_size, elementwise_affine=False, eps=1e-6)
         self.ff_context = FeedForward(hidden_size, mult=mlp_ratio, activation_fn="gelu-approximate")
 
+        self.ff_chunk_size = None
+
     def forward(
         self,
         hidden_states: torch.Tensor,
@@ -696,8 +1015,8 @@ class HunyuanVideoTransformerBlock(nn.Module):
         norm_encoder_hidden_states = norm_encoder_hidden_states * (1 + c_scale_mlp) + c_shift_mlp
 
         # 4. Feed-forward
-        ff_output = self.ff(norm_hidden_states)
-        context_ff_output = self.ff_context(norm_encoder_hidden_states)
+        ff_output = chunked_feed_forward(self.ff, norm_hidden_states, self.ff_chunk_size)
+        context_ff_output = chunked_feed_forward(self.ff_context, norm_encoder_hidden_states, self.ff_chunk_size)
 
         hidden_states = hidden_states + gate_mlp * ff_output
         encoder_hidden_states = encoder_hidden_states + c_gate_mlp * context_ff_output
@@ -819,6 +1138,16 @@ class HunyuanVideoTransformer3DModelPacked(ModelMixin, ConfigMixin, PeftAdapterM
         self.use_gradient_checkpointing = False
         self.enable_teacache = False
         self.magcache: MagCache = None
+        self.first_block_cache: FirstBlockCache = None
+        self.block_delta_cache: BlockDeltaCache = None
+        self.compiled_blocks = False
+        self.context_token_budget = None
+        self.sparse_context_stride = None
+        self.layer_devices = None
+        self.primary_device = None
+        self.warmed_up_layouts = set()
+        self.enable_conditioning_cache = True
+        self.conditioning_cache = SectionConditioningCache()
 
         if has_image_proj:
             self.install_image_projection(image_proj_dim)
@@ -854,6 +1183,7 @@ class HunyuanVideoTransformer3DModelPacked(ModelMixin, ConfigMixin, PeftAdapterM
         self.previous_modulated_input = None
         self.previous_residual = None
         self.teacache_rescale_func = np.poly1d([7.33226126e+02, -4.01131952e+02, 6.75869174e+01, -3.14987800e+00, 9.61237896e-02])
+        self.teacache_branch_state = CacheBranchState(self, ['cnt', 'accumulated_rel_l1_distance', 'previous_modulated_input', 'previous_residual'])
 
     def install_magcache(self, magcache: MagCache):
         self.magcache = magcache
@@ -861,6 +1191,241 @@ class HunyuanVideoTransformer3DModelPacked(ModelMixin, ConfigMixin, PeftAdapterM
     def uninstall_magcache(self):
         self.magcache = None
 
+    def select_cache_branch(self, branch):
+        """
+        Selects which CFG branch ('positive', 'negative', or 'batched' for both at once) the step caches
+        should read and update, so TeaCache/MagCache/First Block Cache/Block Delta Cache keep independent
+        state per branch.
+        Tiled denoising appends the tile position, giving every tile its own state as well.
+        """
+        if self.enable_teacache:
+            self.teacache_branch_state.select(branch)
+        if self.magcache is not None:
+            self.magcache.select_branch(branch)
+        if self.first_block_cache is not None:
+            self.first_block_cache.select_branch(branch)
+        if self.block_delta_cache is not None:
+            self.block_delta_cache.select_branch(branch)
+
+    def reset_step_caches(self):
+        """
+        Restarts the step counters of TeaCache/MagCache/First Block Cache/Block Delta Cache for every branch.
+        The caches count model calls to know where they are in the schedule; a sampler that stops early
+        or calls the model more than once per step would otherwise carry a shifted count into the next section.
+        """
+        if self.enable_teacache:
+            self.teacache_branch_state.reset()
+        for cache in (self.magcache, self.first_block_cache, self.block_delta_cache):
+            if cache is not None:
+                cache.branch_state.reset()
+
+    @contextlib.contextmanager
+    def step_cache_schedule(self, num_steps, first_step=0):
+        """
+        Runs a sampling pass of num_steps steps, starting at first_step of the schedule the step caches
+        were set up for (e.g. the two passes of progressive resolution sampling), then restores them.
+        Each cache counts and retains steps for the pass; MagCache reads the ratios of the pass's steps.
+        """
+        caches = [cache for cache in (self.magcache, self.first_block_cache, self.block_delta_cache) if cache is not None]
+        saved = ([(self, self.num_steps)] if self.enable_teacache else []) + [(cache, cache.num_steps) for cache in caches]
+        saved_mag_ratios = self.magcache.mag_ratios if self.magcache is not None else None
+
+        for owner, _ in saved:
+            owner.num_steps = num_steps
+        if saved_mag_ratios is not None:
+            self.magcache.mag_ratios = saved_mag_ratios[first_step:first_step + num_steps]
+        try:
+            yield
+        finally:
+            for owner, owner_num_steps in saved:
+                owner.num_steps = owner_num_steps
+            if self.magcache is not None:
+                self.magcache.mag_ratios = saved_mag_ratios
+
+    @contextlib.contextmanager
+    def step_caches_suspended(self):
+        """
+        Turns TeaCache/MagCache/First Block Cache/Block Delta Cache off for the duration of the block.
+        Used by samplers that evaluate several timesteps in one model call, which the per-call step counters cannot follow.
+        """
+        enable_teacache = self.enable_teacache
+        caches = [cache for cache in (self.magcache, self.first_block_cache, self.block_delta_cache) if cache is not None and cache.is_enabled]
+        self.enable_teacache = False
+        for cache in caches:
+            cache.is_enabled = False
+        try:
+            yield
+        finally:
+            self.enable_teacache = enable_teacache
+            for cache in caches:
+                cache.is_enabled = True
+
+    def install_first_block_cache(self, first_block_cache: FirstBlockCache):
+        self.first_block_cache = first_block_cache
+
+    def uninstall_first_block_cache(self):
+        self.first_block_cache = None
+
+    def install_block_delta_cache(self, block_delta_cache: BlockDeltaCache):
+        self.block_delta_cache = block_delta_cache
+
+    def uninstall_block_delta_cache(self):
+        self.block_delta_cache = None
+
+    def fuse_qkv_projections(self):
+        """
+        Fuses the q/k/v (and added context q/k/v) projections of every transformer block into single GEMMs.
+        Must be called before DynamicSwapInstaller.install_model so the fused layers are swapped too.
+        """
+        for block in list(self.transformer_blocks) + list(self.single_transformer_blocks):
+            fuse_attention_projections(block.attn)
+        print('Fused QKV projections of transformer blocks')
+
+    def unfuse_qkv_projections(self):
+        """
+        Restores separate q/k/v projections, e.g. before loading LoRAs that target to_q/to_k/to_v.
+        """
+        if not self.has_fused_qkv_projections():
+            return
+        for block in list(self.transformer_blocks) + list(self.single_transformer_blocks):
+            unfuse_attention_projections(block.attn)
+        print('Unfused QKV projections of transformer blocks')
+
+    def has_fused_qkv_projections(self):
+        return any(block.attn.fused_projections for block in list(self.transformer_blocks) + list(self.single_transformer_blocks))
+
+    def quantize_linear_layers(self, mode='int8'):
+        """
+        Replaces the nn.Linear layers inside the transformer blocks with weight-only int8/fp8 layers.
+        Embedders and the output projection stay in full precision.
+        Must be called before DynamicSwapInstaller.install_model, and after fuse_qkv_projections if both are used.
+        """
+        count = 0
+        for block in list(self.transformer_blocks) + list(self.single_transformer_blocks):
+            count += replace_linear_layers(block, lambda linear: WeightOnlyQuantLinear.from_linear(linear, mode=mode), nn.Linear)
+        print(f'Quantized {count} linear layers of transformer blocks to {mode}')
+
+    def dequantize_linear_layers(self, dtype=torch.bfloat16):
+        """
+        Converts weight-only quantized layers back to nn.Linear, e.g. before loading LoRAs.
+        The rounding error of the quantization is kept.
+        """
+        if not self.has_quantized_linear_layers():
+            return
+        count = 0
+        for block in list(self.transformer_blocks) + list(self.single_transformer_blocks):
+            count += replace_linear_layers(block, lambda layer: layer.to_linear(dtype=dtype), WeightOnlyQuantLinear)
+        print(f'Dequantized {count} linear layers of transformer blocks')
+
+    def has_quantized_linear_layers(self):
+        return any(isinstance(m, WeightOnlyQuantLinear) for m in self.modules())
+
+    def set_ff_chunk_size(self, chunk_size=None):
+        """
+        Runs the feed-forward layers of every block over sequence chunks of this many tokens
+        (None or 0 for the whole sequence at once). Outputs are unchanged; the activation peak drops.
+        """
+        for block in list(self.transformer_blocks) + list(self.single_transformer_blocks):
+            block.ff_chunk_size = chunk_size or None
+
+    def apply_layer_placement(self, layer_devices, primary_device):
+        """
+        Places each transformer block on its own device (see memory.plan_layer_placement), with the
+        embedders, output layers and everything else on primary_device. Blocks are counted dual-stream first.
+        """
+        blocks = list(self.transformer_blocks) + list(self.single_transformer_blocks)
+        assert len(layer_devices) == len(blocks), f'Expected {len(blocks)} layer devices, got {len(layer_devices)}'
+
+        for name, child in self.named_children():
+            if name not in ('transformer_blocks', 'single_transformer_blocks'):
+                child.to(primary_device)
+
+        for block, device in zip(blocks, layer_devices):
+            block.to(device)
+
+        self.layer_devices = [torch.device(d) for d in layer_devices]
+        self.primary_device = torch.device(primary_device)
+
+        summary = OrderedDict()
+        for device in self.layer_devices:
+            summary[str(device)] = summary.get(str(device), 0) + 1
+        print(f'Placed transformer blocks across devices: {dict(summary)}')
+
+    def compile_transformer_blocks(self, mode=None):
+        """
+        Regional compilation: compiles each double- and single-stream block on its own with dynamic shapes,
+        so one graph per block type serves every resolution bucket and compile time stays bounded.
+        The fused norm/modulation/gating elementwise ops are the main win; attention runs eagerly.
+        Parameters must live on the compute device (not compatible with DynamicSwapInstaller).
+        """
+        for block in list(self.transformer_blocks) + list(self.single_transformer_blocks):
+            block.compile(dynamic=True, mode=mode)
+        self.compiled_blocks = True
+        print('Enabled regional torch.compile for transformer blocks')
+
+    @staticmethod
+    def packed_context_lengths(height, width):
+        """
+        Approximate (4x, 2x, 1x) clean context token counts for a pixel bucket: 16 frames at 4x, 2 at 2x
+        and 2 at 1x compression, i.e. 2.5 frames worth of tokens next to the noisy window.
+        """
+        tokens_per_frame = (height // 16) * (width // 16)
+        return tokens_per_frame // 4, tokens_per_frame // 4, tokens_per_frame * 2
+
+    @torch.inference_mode()
+    def warmup_compiled_blocks(self, height, width, latent_window_size, text_seq_len=512, image_seq_len=729, batch_size=1, device=None, dtype=torch.bfloat16):
+        """
+        Runs the compiled blocks once on synthetic inputs laid out like a real forward (float32 RoPE,
+        the same attention mask form and sparse context plan), so compilation happens up front instead
+        of in the first sampling step of a job. Blocks are compiled with dynamic shapes, so one warmup
+        per batch layout and dtype covers every resolution.
+        Uses inference mode like sample_hunyuan, since dynamo guards on it.
+        """
+        if not self.compiled_blocks:
+            return
+
+        layout = (batch_size, dtype, bool(self.sparse_context_stride and self.sparse_context_stride > 1))
+        if layout in self.warmed_up_layouts:
+            return
+
+        context_lengths = self.packed_context_lengths(height, width)
+        num_noisy_tokens = (height // 16) * (width // 16) * latent_window_size
+        seq_len = sum(context_lengths) + num_noisy_tokens
+        if self.image_projection is not None:
+            text_seq_len += image_seq_len
+
+        print(f'Warming up compiled transformer blocks for {seq_len} image tokens, batch size {batch_size}')
+        rope_dim = self.config['attention_head_dim'] * 2
+        hidden_states = torch.zeros((batch_size, seq_len, self.inner_dim), device=device, dtype=dtype)
+        temb = torch.zeros((batch_size, self.inner_dim), device=device, dtype=dtype)
+        # RoPE frequencies stay in float32, as computed by HunyuanVideoRotaryPosEmbed
+        rope_freqs = torch.zeros((batch_size, seq_len, rope_dim), device=device, dtype=torch.float32)
+
+        if batch_size == 1:
+            # The real forward crops the text to its valid length; the compiled graphs take any length
+            encoder_hidden_states = torch.zeros((batch_size, text_seq_len // 2, self.inner_dim), device=device, dtype=dtype)
+            attention_mask = None, None, None, None
+        else:
+            encoder_hidden_states = torch.zeros((batch_size, text_seq_len, self.inner_dim), device=device, dtype=dtype)
+            text_mask = torch.zeros((batch_size, text_seq_len), device=device, dtype=torch.bool)
+            text_mask[:, :text_seq_len // 2] = True
+            cu_seqlens = get_cu_seqlens(text_mask, seq_len)
+            attention_mask = cu_seqlens, cu_seqlens, seq_len + text_seq_len, seq_len + text_seq_len
+
+        attention_mask = attention_mask + (build_sparse_context_plan(context_lengths, num_noisy_tokens, self.sparse_context_stride, device),)
+
+        self._run_denoising_layers(hidden_states, encoder_hidden_states, temb, attention_mask, rope_freqs)
+        self.warmed_up_layouts.add(layout)
+
+    def clear_conditioning_cache(self):
+        self.conditioning_cache.clear()
+
+    def cached_conditioning(self, name, inputs, compute_fn):
+        # Section-constant inputs are only cached for inference; training needs fresh graphs
+        if not self.enable_conditioning_cache or torch.is_grad_enabled():
+            return compute_fn()
+        return self.conditioning_cache.get(name, inputs, compute_fn)
+
     def gradient_checkpointing_method(self, block, *args):
         if self.use_gradient_checkpointing:
             result = torch.utils.checkpoint.checkpoint(block, *args, use_reentrant=False)
@@ -873,29 +1438,69 @@ class HunyuanVideoTransformer3DModelPacked(ModelMixin, ConfigMixin, PeftAdapterM
             latents, latent_indices=None,
             clean_latents=None, clean_latent_indices=None,
             clean_latents_2x=None, clean_latent_2x_indices=None,
-            clean_latents_4x=None, clean_latent_4x_indices=None
+            clean_latents_4x=None, clean_latent_4x_indices=None,
+            rope_offset=(0, 0)
     ):
         hidden_states = self.gradient_checkpointing_method(self.x_embedder.proj, latents)
         B, C, T, H, W = hidden_states.shape
 
+        # The caller's indices (None when derived from T) key the context cache, since the budget trim depends on them
+        given_latent_indices = latent_indices
         if latent_indices is None:
             latent_indices = torch.arange(0, T).unsqueeze(0).expand(B, -1)
 
         hidden_states = hidden_states.flatten(2).transpose(1, 2)
 
-        rope_freqs = self.rope(frame_indices=latent_indices, height=H, width=W, device=hidden_states.device)
+        rope_freqs = self.rope(frame_indices=latent_indices, height=H, width=W, device=hidden_states.device, offset=rope_offset)
         rope_freqs = rope_freqs.flatten(2).transpose(1, 2)
 
+        clean_inputs = (clean_latents, clean_latent_indices, clean_latents_2x, clean_latent_2x_indices, clean_latents_4x, clean_latent_4x_indices)
+
+        def compute_clean_latents():
+            inputs = clean_inputs
+            if self.context_token_budget:
+                inputs = fit_clean_latents_to_budget(self.context_token_budget, hidden_states.shape[1], H, W, latent_indices, *inputs)
+            return self.process_clean_latents(hidden_states, H, W, *inputs, rope_offset=rope_offset)
+
+        # Spatial tiles each get their own entry, so alternating between tiles does not evict the others
+        clean_hidden_states, clean_rope_freqs, context_lengths = self.cached_conditioning(
+            f'clean_latents{tuple(rope_offset)}', clean_inputs + (H, W, hidden_states.dtype, hidden_states.device, self.context_token_budget, given_latent_indices, hidden_states.shape[1]),
+            compute_clean_latents
+        )
+
+        if clean_hidden_states is not None:
+            hidden_states = torch.cat([clean_hidden_states, hidden_states], dim=1)
+            rope_freqs = torch.cat([clean_rope_freqs, rope_freqs], dim=1)
+
+        return hidden_states, rope_freqs, context_lengths
+
+    def process_clean_latents(
+            self,
+            hidden_states, H, W,
+            clean_latents=None, clean_latent_indices=None,
+            clean_latents_2x=None, clean_latent_2x_indices=None,
+            clean_latents_4x=None, clean_latent_4x_indices=None,
+            rope_offset=(0, 0)
+    ):
+        """
+        Embeds the clean latent history (1x, 2x, 4x) and computes its RoPE frequencies.
+        Returns tokens and frequencies ordered as [4x, 2x, 1x] and the token count of each of the three
+        parts, or (None, None, (0, 0, 0)) if there is no clean context.
+        `hidden_states` is only used as a dtype/device reference.
+        """
+        embedded = []
+        freqs = []
+
         if clean_latents is not None and clean_latent_indices is not None:
             clean_latents = clean_latents.to(hidden_states)
             clean_latents = self.gradient_checkpointing_method(self.clean_x_embedder.proj, clean_latents)
             clean_latents = clean_latents.flatten(2).transpose(1, 2)
 
-            clean_latent_rope_freqs = self.rope(frame_indices=clean_latent_indices, height=H, width=W, device=clean_latents.device)
+            clean_latent_rope_freqs = self.rope(frame_indices=clean_latent_indices, height=H, width=W, device=clean_latents.device, offset=rope_offset)
             clean_latent_rope_freqs = clean_latent_rope_freqs.flatten(2).transpose(1, 2)
 
-            hidden_states = torch.cat([clean_latents, hidden_states], dim=1)
-            rope_freqs = torch.cat([clean_latent_rope_freqs, rope_freqs], dim=1)
+            embedded.insert(0, clean_latents)
+            freqs.insert(0, clean_latent_rope_freqs)
 
         if clean_latents_2x is not None and clean_latent_2x_indices is not None:
             clean_latents_2x = clean_latents_2x.to(hidden_states)
@@ -903,13 +1508,13 @@ class HunyuanVideoTransformer3DModelPacked(ModelMixin, ConfigMixin, PeftAdapterM
             clean_latents_2x = self.gradient_checkpointing_method(self.clean_x_embedder.proj_2x, clean_latents_2x)
             clean_latents_2x = clean_latents_2x.flatten(2).transpose(1, 2)
 
-            clean_latent_2x_rope_freqs = self.rope(frame_indices=clean_latent_2x_indices, height=H, width=W, device=clean_latents_2x.device)
+            clean_latent_2x_rope_freqs = self.rope(frame_indices=clean_latent_2x_indices, height=H, width=W, device=clean_latents_2x.device, offset=rope_offset)
             clean_latent_2x_rope_freqs = pad_for_3d_conv(clean_latent_2x_rope_freqs, (2, 2, 2))
             clean_latent_2x_rope_freqs = center_down_sample_3d(clean_latent_2x_rope_freqs, (2, 2, 2))
             clean_latent_2x_rope_freqs = clean_latent_2x_rope_freqs.flatten(2).transpose(1, 2)
 
-            hidden_states = torch.cat([clean_latents_2x, hidden_states], dim=1)
-            rope_freqs = torch.cat([clean_latent_2x_rope_freqs, rope_freqs], dim=1)
+            embedded.insert(0, clean_latents_2x)
+            freqs.insert(0, clean_latent_2x_rope_freqs)
 
         if clean_latents_4x is not None and clean_latent_4x_indices is not None:
             clean_latents_4x = clean_latents_4x.to(hidden_states)
@@ -917,15 +1522,23 @@ class HunyuanVideoTransformer3DModelPacked(ModelMixin, ConfigMixin, PeftAdapterM
             clean_latents_4x = self.gradient_checkpointing_method(self.clean_x_embedder.proj_4x, clean_latents_4x)
             clean_latents_4x = clean_latents_4x.flatten(2).transpose(1, 2)
 
-            clean_latent_4x_rope_freqs = self.rope(frame_indices=clean_latent_4x_indices, height=H, width=W, device=clean_latents_4x.device)
+            clean_latent_4x_rope_freqs = self.rope(frame_indices=clean_latent_4x_indices, height=H, width=W, device=clean_latents_4x.device, offset=rope_offset)
             clean_latent_4x_rope_freqs = pad_for_3d_conv(clean_latent_4x_rope_freqs, (4, 4, 4))
             clean_latent_4x_rope_freqs = center_down_sample_3d(clean_latent_4x_rope_freqs, (4, 4, 4))
             clean_latent_4x_rope_freqs = clean_latent_4x_rope_freqs.flatten(2).transpose(1, 2)
 
-            hidden_states = torch.cat([clean_latents_4x, hidden_states], dim=1)
-            rope_freqs = torch.cat([clean_latent_4x_rope_freqs, rope_freqs], dim=1)
+            embedded.insert(0, clean_latents_4x)
+            freqs.insert(0, clean_latent_4x_rope_freqs)
+
+        if not embedded:
+            return None, None, (0, 0, 0)
 
-        return hidden_states, rope_freqs
+        context_lengths = (
+            clean_latents_4x.shape[1] if clean_latents_4x is not None and clean_latent_4x_indices is not None else 0,
+            clean_latents_2x.shape[1] if clean_latents_2x is not None and clean_latent_2x_indices is not None else 0,
+            clean_latents.shape[1] if clean_latents is not None and clean_latent_indices is not None else 0,
+        )
+        return torch.cat(embedded, dim=1), torch.cat(freqs, dim=1), context_lengths
 
     def forward(
             self,
@@ -935,12 +1548,17 @@ class HunyuanVideoTransformer3DModelPacked(ModelMixin, ConfigMixin, PeftAdapterM
             clean_latents_2x=None, clean_latent_2x_indices=None,
             clean_latents_4x=None, clean_latent_4x_indices=None,
             image_embeddings=None,
+            cache_branch=None,
+            rope_offset=(0, 0),
             attention_kwargs=None, return_dict=True
     ):
 
         if attention_kwargs is None:
             attention_kwargs = {}
 
+        if cache_branch is not None:
+            self.select_cache_branch(cache_branch)
+
         batch_size, num_channels, num_frames, height, width = hidden_states.shape
         p, p_t = self.config['patch_size'], self.config['patch_size_t']
         post_patch_num_frames = num_frames // p_t
@@ -948,14 +1566,17 @@ class HunyuanVideoTransformer3DModelPacked(ModelMixin, ConfigMixin, PeftAdapterM
         post_patch_width = width // p
         original_context_length = post_patch_num_frames * post_patch_height * post_patch_width
 
-        hidden_states, rope_freqs = self.process_input_hidden_states(hidden_states, latent_indices, clean_latents, clean_latent_indices, clean_latents_2x, clean_latent_2x_indices, clean_latents_4x, clean_latent_4x_indices)
+        hidden_states, rope_freqs, context_lengths = self.process_input_hidden_states(hidden_states, latent_indices, clean_latents, clean_latent_indices, clean_latents_2x, clean_latent_2x_indices, clean_latents_4x, clean_latent_4x_indices, rope_offset)
 
         temb = self.gradient_checkpointing_method(self.time_text_embed, timestep, guidance, pooled_projections)
         encoder_hidden_states = self.gradient_checkpointing_method(self.context_embedder, encoder_hidden_states, timestep, encoder_attention_mask)
 
         if self.image_projection is not None:
             assert image_embeddings is not None, 'You must use image embeddings!'
-            extra_encoder_hidden_states = self.gradient_checkpointing_method(self.image_projection, image_embeddings)
+            extra_encoder_hidden_states = self.cached_conditioning(
+                'image_projection', (image_embeddings,),
+                lambda: self.gradient_checkpointing_method(self.image_projection, image_embeddings)
+            )
             extra_attention_mask = torch.ones((batch_size, extra_encoder_hidden_states.shape[1]), dtype=encoder_attention_mask.dtype, device=encoder_attention_mask.device)
 
             # must cat before (not after) encoder_hidden_states, due to attn masking
@@ -980,6 +1601,9 @@ class HunyuanVideoTransformer3DModelPacked(ModelMixin, ConfigMixin, PeftAdapterM
 
                 attention_mask = cu_seqlens_q, cu_seqlens_kv, max_seqlen_q, max_seqlen_kv
 
+            sparse_context_plan = build_sparse_context_plan(context_lengths, original_context_length, self.sparse_context_stride, hidden_states.device)
+            attention_mask = attention_mask + (sparse_context_plan,)
+
         if self.enable_teacache:
             modulated_inp = self.transformer_blocks[0].norm1(hidden_states, emb=temb)[0]
 
@@ -1016,6 +1640,22 @@ class HunyuanVideoTransformer3DModelPacked(ModelMixin, ConfigMixin, PeftAdapterM
                 hidden_states, encoder_hidden_states = self._run_denoising_layers(hidden_states, encoder_hidden_states, temb, attention_mask, rope_freqs)
                 self.magcache.update_hidden_states(model_prediction_hidden_states=hidden_states)
 
+        elif self.first_block_cache and self.first_block_cache.is_enabled:
+            ori_hidden_states = hidden_states
+
+            hidden_states, encoder_hidden_states = self._run_denoising_layers(hidden_states, encoder_hidden_states, temb, attention_mask, rope_freqs, last_block_index=1)
+
+            if self.first_block_cache.should_skip(hidden_states - ori_hidden_states):
+                hidden_states = self.first_block_cache.estimate_predicted_hidden_states(hidden_states)
+            else:
+                first_block_hidden_states = hidden_states
+                hidden_states, encoder_hidden_states = self._run_denoising_layers(hidden_states, encoder_hidden_states, temb, attention_mask, rope_freqs, first_block_index=1)
+                self.first_block_cache.update_hidden_states(first_block_hidden_states, hidden_states)
+
+        elif self.block_delta_cache and self.block_delta_cache.is_enabled:
+            self.block_delta_cache.begin_step()
+            hidden_states, encoder_hidden_states = self._run_denoising_layers(hidden_states, encoder_hidden_states, temb, attention_mask, rope_freqs, block_cache=self.block_delta_cache)
+
         else:
             hidden_states, encoder_hidden_states = self._run_denoising_layers(hidden_states, encoder_hidden_states, temb, attention_mask, rope_freqs)
 
@@ -1045,18 +1685,50 @@ class HunyuanVideoTransformer3DModelPacked(ModelMixin, ConfigMixin, PeftAdapterM
         encoder_hidden_states: torch.Tensor,
         temb: torch.Tensor,
         attention_mask: Optional[Tuple],
-        rope_freqs: Optional[torch.Tensor]
+        rope_freqs: Optional[torch.Tensor],
+        first_block_index: int = 0,
+        last_block_index: Optional[int] = None,
+        block_cache: Optional[BlockDeltaCache] = None
     ) -> Tuple[torch.Tensor, torch.Tensor]:
         """
         Applies the dual-stream and single-stream transformer blocks.
+        Block indices count the dual-stream blocks first, then the single-stream ones;
+        only blocks in [first_block_index, last_block_index) are run.
+        With a layer placement, activations follow the blocks across devices and return to the primary device.
+        With a block_cache, blocks it marks as stable reuse their cached residual instead of running.
         """
-        for block_id, block in enumerate(self.transformer_blocks):
-            hidden_states, encoder_hidden_states = self.gradient_checkpointing_method(
-                block, hidden_states, encoder_hidden_states, temb, attention_mask, rope_freqs
-            )
+        blocks = list(self.transformer_blocks) + list(self.single_transformer_blocks)
+        if last_block_index is None:
+            last_block_index = len(blocks)
+
+        # Per-device copies of the inputs shared by every block
+        shared_inputs = {}
+
+        for block_id in range(first_block_index, last_block_index):
+            block_temb, block_attention_mask, block_rope_freqs = temb, attention_mask, rope_freqs
+
+            if self.layer_devices is not None:
+                device = self.layer_devices[block_id]
+                if device not in shared_inputs:
+                    shared_inputs[device] = move_to_device((temb, attention_mask, rope_freqs), device)
+                block_temb, block_attention_mask, block_rope_freqs = shared_inputs[device]
+                hidden_states, encoder_hidden_states = hidden_states.to(device), encoder_hidden_states.to(device)
+
+            if block_cache is not None and block_cache.should_skip(block_id):
+                hidden_states, encoder_hidden_states = block_cache.apply_cached_residual(block_id, hidden_states, encoder_hidden_states)
+                continue
+
+            block_inputs = hidden_states, encoder_hidden_states
 
-        for block_id, block in enumerate(self.single_transformer_blocks):
             hidden_states, encoder_hidden_states = self.gradient_checkpointing_method(
-                block, hidden_states, encoder_hidden_states, temb, attention_mask, rope_freqs
+                blocks[block_id], hidden_states, encoder_hidden_states, block_temb, block_attention_mask, block_rope_freqs
             )
+
+            if block_cache is not None:
+                block_cache.update(block_id, block_inputs, (hidden_states, encoder_hidden_states))
+
+        if self.layer_devices is not None:
+            hidden_states = hidden_states.to(self.primary_device)
+            encoder_hidden_states = encoder_hidden_states.to(self.primary_device)
+
         return hidden_states, encoder_hidden_states
\ No newline at end of file
@@ -2,6 +2,7 @@ import numpy as np
 import torch
 import os
 
+from diffusers_helper.models.cache_branches import CacheBranchState
 from diffusers_helper.models.mag_cache_ratios import MAG_RATIOS_DB
 
 
@@ -37,6 +38,17 @@ class MagCache:
 
         self._init_for_every_section()
 
+        self.branch_state = CacheBranchState(self, [
+            'step_index', 'steps_skipped_list', 'accumulated_ratio', 'accumulated_steps', 'accumulated_err',
+            'norm_ratio', 'norm_std', 'cos_dis', 'hidden_states', 'previous_residual',
+        ])
+
+    def select_branch(self, branch):
+        """
+        Switches to the per-step state of the given CFG branch, so each branch skips independently.
+        """
+        self.branch_state.select(branch)
+
 
     def _init_for_every_section(self):
         self.step_index = 0
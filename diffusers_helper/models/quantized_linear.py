@@ -0,0 +1,86 @@
+import torch
+import torch.nn as nn
+
+
+QUANTIZATION_MODES = ('int8', 'fp8')
+
+
+def fp8_supported():
+    return hasattr(torch, 'float8_e4m3fn')
+
+
+class WeightOnlyQuantLinear(nn.Module):
+    """
+    Linear layer with per-output-channel int8 or fp8 (e4m3) weights and a float scale per channel.
+    The weight is dequantized to the input dtype right before the matmul, so it runs on any device
+    (CPU included) and activations stay in full precision. Only the weight bytes shrink, which halves
+    what DynamicSwapInstaller streams to the GPU for every block.
+    """
+
+    def __init__(self, in_features, out_features, bias=True, mode='int8', device=None, dtype=torch.bfloat16):
+        super().__init__()
+        assert mode in QUANTIZATION_MODES, f'Unknown quantization mode {mode}'
+        self.in_features = in_features
+        self.out_features = out_features
+        self.mode = mode
+
+        weight_dtype = torch.int8 if mode == 'int8' else torch.float8_e4m3fn
+        self.weight = nn.Parameter(torch.empty((out_features, in_features), dtype=weight_dtype, device=device), requires_grad=False)
+        self.weight_scale = nn.Parameter(torch.empty((out_features, 1), dtype=torch.float32, device=device), requires_grad=False)
+        self.bias = nn.Parameter(torch.empty(out_features, dtype=dtype, device=device), requires_grad=False) if bias else None
+
+    @classmethod
+    @torch.no_grad()
+    def from_linear(cls, linear: nn.Linear, mode='int8'):
+        weight = linear.weight.data.float()
+        max_value = 127.0 if mode == 'int8' else torch.finfo(torch.float8_e4m3fn).max
+
+        scale = (weight.abs().amax(dim=1, keepdim=True) / max_value).clamp_min(1e-12)
+        quantized = weight / scale
+        if mode == 'int8':
+            quantized = quantized.round().clamp(-127, 127)
+
+        layer = cls(linear.in_features, linear.out_features, bias=linear.bias is not None, mode=mode, device='meta', dtype=linear.weight.dtype)
+        layer.weight = nn.Parameter(quantized.to(layer.weight.dtype), requires_grad=False)
+        layer.weight_scale = nn.Parameter(scale, requires_grad=False)
+        if linear.bias is not None:
+            layer.bias = nn.Parameter(linear.bias.data.clone(), requires_grad=False)
+        return layer
+
+    @torch.no_grad()
+    def to_linear(self, dtype=torch.bfloat16):
+        """
+        Returns an equivalent nn.Linear with the dequantized weight (lossy: the rounding is not undone).
+        """
+        linear = nn.Linear(self.in_features, self.out_features, bias=self.bias is not None, device='meta', dtype=dtype)
+        linear.weight = nn.Parameter(self.dequantize_weight(dtype), requires_grad=False)
+        if self.bias is not None:
+            linear.bias = nn.Parameter(self.bias.data.to(dtype), requires_grad=False)
+        return linear
+
+    def dequantize_weight(self, dtype):
+        return self.weight.to(dtype) * self.weight_scale.to(dtype)
+
+    def forward(self, x):
+        weight = self.dequantize_weight(x.dtype)
+        bias = self.bias.to(x.dtype) if self.bias is not None else None
+        return nn.functional.linear(x, weight, bias)
+
+    def extra_repr(self):
+        return f'in_features={self.in_features}, out_features={self.out_features}, bias={self.bias is not None}, mode={self.mode}'
+
+
+def replace_linear_layers(module: nn.Module, convert_fn, source_class):
+    """
+    Replaces every submodule of type source_class with convert_fn(submodule). Returns the number replaced.
+    Must run while DynamicSwapInstaller is not installed, since new modules are not swap-hooked.
+    """
+    count = 0
+    for name, child in list(module.named_children()):
+        # Layers whose weight was fused into another layer (weight is None) are left alone
+        if isinstance(child, source_class) and getattr(child, 'weight', None) is not None:
+            setattr(module, name, convert_fn(child))
+            count += 1
+        else:
+            count += replace_linear_layers(child, convert_fn, source_class)
+    return count
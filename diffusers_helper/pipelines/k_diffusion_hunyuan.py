@@ -1,8 +1,12 @@
 import torch
 import math
+import contextlib
+
+from functools import partial
 
 from diffusers_helper.k_diffusion.uni_pc_fm import sample_unipc
-from diffusers_helper.k_diffusion.wrapper import fm_wrapper
+from diffusers_helper.k_diffusion.samplers_fm import sample_euler, sample_heun, sample_dpmpp_2m, sample_dpmpp_3m, sample_picard
+from diffusers_helper.k_diffusion.wrapper import fm_wrapper, TILED_KWARGS
 from diffusers_helper.utils import repeat_to_batch_size
 
 
@@ -24,6 +28,41 @@ def get_flux_sigmas_from_mu(n, mu):
     return sigmas
 
 
+def randn_latents(shape, generator, device):
+    """
+    Standard normal latents. With a list of generators, each sample gets the same noise as a
+    batch-size-1 run with its own generator.
+    """
+    if isinstance(generator, (list, tuple)):
+        assert len(generator) == shape[0], f'Expected {shape[0]} generators, got {len(generator)}'
+        return torch.cat([torch.randn((1, *shape[1:]), generator=g, device=g.device).to(device=device, dtype=torch.float32) for g in generator])
+    return torch.randn(shape, generator=generator, device=generator.device).to(device=device, dtype=torch.float32)
+
+
+def resize_latents(latents, height, width):
+    """
+    Resizes the spatial dims of (B, C, T, H, W) latents: area averaging when shrinking, trilinear when growing.
+    """
+    mode = 'area' if height <= latents.shape[3] and width <= latents.shape[4] else 'trilinear'
+    return torch.nn.functional.interpolate(latents, size=(latents.shape[2], height, width), mode=mode)
+
+
+# All samplers take (model, noise, sigmas, extra_args, callback, disable) and the same flux sigmas.
+# Heun calls the model twice per step; Picard batches a window of steps per call; the others call it once per step.
+SAMPLERS = {
+    'unipc': sample_unipc,
+    'unipc_bh2': partial(sample_unipc, variant='bh2'),
+    'euler': sample_euler,
+    'heun': sample_heun,
+    'dpmpp_2m': sample_dpmpp_2m,
+    'dpmpp_3m': sample_dpmpp_3m,
+    'picard': sample_picard,
+}
+
+# Samplers that put several timesteps in one model call, which the transformer's step caches cannot follow
+PARALLEL_SAMPLERS = ('picard',)
+
+
 @torch.inference_mode()
 def sample_hunyuan(
         transformer,
@@ -37,8 +76,18 @@ def sample_hunyuan(
         real_guidance_scale=1.0,
         distilled_guidance_scale=6.0,
         guidance_rescale=0.0,
+        cfg_interval=None,
+        batch_cfg=False,
+        tile_size=None,
+        tile_overlap=128,
         shift=None,
         num_inference_steps=25,
+        low_res_steps=0,
+        low_res_scale=0.5,
+        early_exit_tolerance=None,
+        early_exit_min_steps=0,
+        parallel_window_size=8,
+        parallel_tolerance=0.01,
         batch_size=None,
         generator=None,
         prompt_embeds=None,
@@ -58,7 +107,8 @@ def sample_hunyuan(
     if batch_size is None:
         batch_size = int(prompt_embeds.shape[0])
 
-    latents = torch.randn((batch_size, 16, (frames + 3) // 4, height // 8, width // 8), generator=generator, device=generator.device).to(device=device, dtype=torch.float32)
+    latents = randn_latents((batch_size, 16, (frames + 3) // 4, height // 8, width // 8), generator, device)
+    noise = latents
 
     B, C, T, H, W = latents.shape
     seq_length = T * H * W // 4
@@ -70,6 +120,13 @@ def sample_hunyuan(
 
     sigmas = get_flux_sigmas_from_mu(num_inference_steps, mu).to(device)
 
+    if tile_size:
+        # Tiles must span an even number of latents (multiples of 16px) for the 2x2 patchify, and at least 64px
+        requested_tile_size = tile_size
+        tile_size = max(int(tile_size), 64) // 16 * 16
+        if tile_size != requested_tile_size:
+            print(f'Denoising tile size {requested_tile_size}px adjusted to {tile_size}px.')
+
     k_model = fm_wrapper(transformer)
 
     if initial_latent is not None:
@@ -95,6 +152,12 @@ def sample_hunyuan(
         dtype=dtype,
         cfg_scale=real_guidance_scale,
         cfg_rescale=guidance_rescale,
+        # (low, high) sigma range where real CFG is applied; None applies it on every step
+        cfg_interval=cfg_interval,
+        batch_cfg=batch_cfg,
+        # Tiling works on the latent grid: pixel sizes are divided by the VAE's 8x downscale
+        tile_size=tile_size // 8 if tile_size else None,
+        tile_overlap=tile_overlap // 8,
         concat_latent=concat_latent,
         positive=dict(
             pooled_projections=prompt_poolers,
@@ -112,9 +175,101 @@ def sample_hunyuan(
         )
     )
 
-    if sampler == 'unipc':
-        results = sample_unipc(k_model, latents, sigmas, extra_args=sampler_kwargs, disable=False, callback=callback)
-    else:
-        raise NotImplementedError(f'Sampler {sampler} is not supported.')
+    # Early exit is only implemented by the UniPC sampler
+    sampler_options = {}
+    if early_exit_tolerance:
+        if sampler in ('unipc', 'unipc_bh2'):
+            sampler_options = dict(early_exit_tolerance=early_exit_tolerance, early_exit_min_steps=early_exit_min_steps)
+        else:
+            print(f'Early exit is not supported by sampler {sampler}, running all steps.')
+
+    # Picard iteration: how many steps are denoised per batch, and the RMS latent change at which a step is final
+    parallel_options = {}
+    if sampler in PARALLEL_SAMPLERS:
+        parallel_options = dict(window_size=max(int(parallel_window_size), 1), tolerance=float(parallel_tolerance))
+        sampler_options.update(parallel_options)
+
+    # Section-constant conditioning is cached inside the transformer for the duration of this call only
+    transformer.clear_conditioning_cache()
+    transformer.reset_step_caches()
+
+    step_cache_contexts = contextlib.ExitStack()
+    try:
+        if sampler not in SAMPLERS:
+            raise NotImplementedError(f'Sampler {sampler} is not supported.')
+
+        # The step caches count model calls, so they are off while a parallel sampler batches several steps per call
+        if sampler in PARALLEL_SAMPLERS:
+            step_cache_contexts.enter_context(transformer.step_caches_suspended())
+
+        low_res_steps = min(int(low_res_steps or 0), num_inference_steps - 1)
+        if low_res_steps > 0:
+            # Progressive resolution: the first low_res_steps run on a downscaled latent (and context),
+            # then the last x0 estimate is upscaled and re-noised to the sigma where the full resolution steps resume
+            low_res_height = max(int(H * low_res_scale) // 2 * 2, 2)
+            low_res_width = max(int(W * low_res_scale) // 2 * 2, 2)
+
+            # Area averaging shrinks the noise std, so it is scaled back to unit variance
+            low_res_latents = resize_latents(noise, low_res_height, low_res_width) * math.sqrt((H * W) / (low_res_height * low_res_width))
+            if initial_latent is not None:
+                low_res_latents = resize_latents(initial_latent, low_res_height, low_res_width) * (1.0 - first_sigma) + low_res_latents * first_sigma
+
+            # Shared tensors (the same clean latents in both branches) are resized once, so the conditioning cache still hits
+            resized = {}
+
+            def resize_shared(v):
+                if id(v) not in resized:
+                    resized[id(v)] = resize_latents(v, low_res_height, low_res_width)
+                return resized[id(v)]
+
+            def downscale_kwargs(branch_kwargs):
+                return {k: resize_shared(v) if k in TILED_KWARGS and v is not None else v for k, v in branch_kwargs.items()}
+
+            low_res_kwargs = dict(
+                sampler_kwargs,
+                concat_latent=resize_shared(concat_latent) if concat_latent is not None else None,
+                positive=downscale_kwargs(sampler_kwargs['positive']),
+                negative=downscale_kwargs(sampler_kwargs['negative']),
+            )
+
+            # The low resolution pass stops at the switch sigma; its last step's x0 estimate is read from the
+            # callback, so switching costs no extra model call
+            low_res_sigmas = sigmas[:low_res_steps + 1]
+            progress_callback = callback
+            cancelled = False
+            low_res_x0 = None
+
+            def low_res_callback(d):
+                nonlocal cancelled, low_res_x0
+                low_res_x0 = d['denoised']
+                result = progress_callback(d) if progress_callback is not None else None
+                cancelled = cancelled or result == 'cancel'
+                return result
+
+            with transformer.step_cache_schedule(low_res_steps):
+                SAMPLERS[sampler](k_model, low_res_latents, low_res_sigmas, extra_args=low_res_kwargs, disable=False, callback=low_res_callback, **parallel_options)
+            if cancelled:
+                return resize_latents(low_res_x0, H, W)
+
+            sigma = sigmas[low_res_steps]
+            latents = resize_latents(low_res_x0, H, W) * (1.0 - sigma) + randn_latents(latents.shape, generator, device) * sigma
+            sigmas = sigmas[low_res_steps:]
+            step_cache_contexts.enter_context(transformer.step_cache_schedule(len(sigmas) - 1, first_step=low_res_steps))
+
+            # Full resolution steps report progress after the low resolution ones
+            def full_res_callback(d):
+                return progress_callback({**d, 'i': d['i'] + low_res_steps})
+
+            if progress_callback is not None:
+                callback = full_res_callback
+
+            # Cached conditioning and step cache residuals are for the low resolution tokens
+            transformer.clear_conditioning_cache()
+            transformer.reset_step_caches()
+
+        results = SAMPLERS[sampler](k_model, latents, sigmas, extra_args=sampler_kwargs, disable=False, callback=callback, **sampler_options)
+    finally:
+        step_cache_contexts.close()
+        transformer.clear_conditioning_cache()
 
     return results
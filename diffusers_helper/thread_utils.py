@@ -1,6 +1,6 @@
 import time
 
-from threading import Thread, Lock
+from threading import Thread, Lock, Condition
 
 
 class Listener:
@@ -40,6 +40,66 @@ def async_run(func, *args, **kwargs):
     Listener.add_task(func, *args, **kwargs)
 
 
+class LatestWinsWorker:
+    """
+    Runs func on a background thread for the most recently submitted arguments only.
+    Submissions made while func is busy replace each other (latest wins) instead of queueing,
+    so a slow consumer never stalls the producer or falls behind.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.slot = None
+        self.busy = False
+        self.closed = False
+        self.condition = Condition(Lock())
+        self.thread = None
+
+    def submit(self, *args, **kwargs):
+        with self.condition:
+            self.slot = (args, kwargs)
+            self.condition.notify()
+
+        if self.thread is None:
+            self.thread = Thread(target=self._process_tasks, daemon=True)
+            self.thread.start()
+
+    def _process_tasks(self):
+        while True:
+            with self.condition:
+                while self.slot is None and not self.closed:
+                    self.condition.wait()
+                if self.slot is None:
+                    return
+                args, kwargs = self.slot
+                self.slot = None
+                self.busy = True
+
+            try:
+                self.func(*args, **kwargs)
+            except Exception as e:
+                print(f"Error in latest-wins worker thread: {e}")
+
+            with self.condition:
+                self.busy = False
+                self.condition.notify_all()
+
+    def flush(self):
+        """Blocks until the pending submission, if any, has been processed."""
+        with self.condition:
+            while (self.slot is not None or self.busy) and self.thread is not None:
+                self.condition.wait()
+
+    def close(self):
+        """Finishes the pending submission, if any, and stops the thread."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+        if self.thread is not None:
+            self.thread.join()
+
+
 class FIFOQueue:
     def __init__(self):
         self.queue = []
@@ -2,6 +2,8 @@ import torch
 import os # required for os.path
 from abc import ABC, abstractmethod
 from diffusers_helper import lora_utils
+from diffusers_helper.memory import DynamicSwapInstaller, get_module_size_bytes, get_device_budget_bytes, plan_layer_placement
+from diffusers_helper.models.quantized_linear import fp8_supported
 from typing import List, Optional
 from pathlib import Path
 
@@ -62,6 +64,92 @@ class BaseModelGenerator(ABC):
         This method should be implemented by each specific model generator.
         """
         pass
+
+    def apply_transformer_optimizations(self):
+        """
+        Apply the opt-in structural optimizations from the performance settings.
+        Must be called after the transformer is loaded and before DynamicSwapInstaller
+        is installed, since the swap hooks are bound to the module layout.
+        """
+        if self.transformer is None or self.settings is None:
+            return
+
+        if self.settings.get("fuse_qkv", False):
+            self.transformer.fuse_qkv_projections()
+
+        quantization = self.settings.get("weight_quantization", "None")
+        if quantization in ("int8", "fp8"):
+            if quantization == "fp8" and not fp8_supported():
+                print("fp8 weights are not supported by this PyTorch version, using int8 instead")
+                quantization = "int8"
+            self.transformer.quantize_linear_layers(mode=quantization)
+
+        if self.settings.get("compile_transformer", False):
+            if self.high_vram or len(self.get_layer_placement_devices()) > 1:
+                self.transformer.compile_transformer_blocks()
+            else:
+                # Dynamo reads parameters directly and would miss the DynamicSwap device hooks
+                print("Regional compilation requires high-VRAM mode or a layer placement, skipping torch.compile")
+
+    def get_layer_placement_devices(self):
+        """
+        Devices from the layer_placement_devices setting, e.g. "cuda:0,cuda:1" or "cuda:0,cpu".
+        """
+        if self.settings is None:
+            return []
+        value = self.settings.get("layer_placement_devices", "") or ""
+        return [torch.device(d.strip()) for d in value.split(",") if d.strip()]
+
+    def place_transformer(self):
+        """
+        Put the loaded transformer on its compute device(s): split across several devices when a
+        layer placement is configured, otherwise DynamicSwap offloading or the whole model on the GPU.
+        """
+        devices = self.get_layer_placement_devices()
+
+        if len(devices) > 1:
+            preserved_memory_gb = self.settings.get("gpu_memory_preservation", 6)
+            budgets = [(device, get_device_budget_bytes(device, preserved_memory_gb)) for device in devices]
+
+            blocks = list(self.transformer.transformer_blocks) + list(self.transformer.single_transformer_blocks)
+            block_sizes = [get_module_size_bytes(block) for block in blocks]
+
+            # Embedders and output layers always live on the first device
+            primary_device, primary_budget = budgets[0]
+            budgets[0] = (primary_device, primary_budget - (get_module_size_bytes(self.transformer) - sum(block_sizes)))
+
+            try:
+                layer_devices = plan_layer_placement(block_sizes, budgets)
+            except ValueError as e:
+                print(f"Layer placement failed ({e}), falling back to single-device loading")
+            else:
+                self.transformer.apply_layer_placement(layer_devices, primary_device)
+                return
+
+        if not self.high_vram:
+            DynamicSwapInstaller.install_model(self.transformer, device=self.gpu)
+        else:
+            # In high VRAM mode, move the entire model to GPU
+            self.transformer.to(device=self.gpu)
+
+    def restore_transformer_for_lora(self):
+        """
+        Undo QKV fusion and weight quantization so LoRA adapters can target plain to_q/to_k/to_v linears.
+        DynamicSwapInstaller is removed around the change so the swap hooks cover the new modules.
+        """
+        if not self.transformer.has_quantized_linear_layers() and not self.transformer.has_fused_qkv_projections():
+            return
+
+        print("Restoring plain linear layers for LoRA loading")
+        uses_dynamic_swap = not self.high_vram and self.transformer.layer_devices is None
+        if uses_dynamic_swap:
+            DynamicSwapInstaller.uninstall_model(self.transformer)
+
+        self.transformer.dequantize_linear_layers()
+        self.transformer.unfuse_qkv_projections()
+
+        if uses_dynamic_swap:
+            DynamicSwapInstaller.install_model(self.transformer, device=self.gpu)
     
     @abstractmethod
     def get_model_name(self):
@@ -238,6 +326,9 @@ class BaseModelGenerator(ABC):
             print("No LoRAs selected, skipping loading.")
             return
 
+        # LoRA adapters target the separate, unquantized to_q/to_k/to_v projections
+        self.restore_transformer_for_lora()
+
         lora_dir = Path(lora_folder)
 
         adapter_names = []
@@ -1,7 +1,6 @@
 import torch
 import os # for offline loading path
 from diffusers_helper.models.hunyuan_video_packed import HunyuanVideoTransformer3DModelPacked
-from diffusers_helper.memory import DynamicSwapInstaller
 from .base_generator import BaseModelGenerator
 
 class F1ModelGenerator(BaseModelGenerator):
@@ -46,13 +45,10 @@ class F1ModelGenerator(BaseModelGenerator):
         self.transformer.eval()
         self.transformer.to(dtype=torch.bfloat16)
         self.transformer.requires_grad_(False)
+        self.apply_transformer_optimizations()
         
-        # Set up dynamic swap if not in high VRAM mode
-        if not self.high_vram:
-            DynamicSwapInstaller.install_model(self.transformer, device=self.gpu)
-        else:
-            # In high VRAM mode, move the entire model to GPU
-            self.transformer.to(device=self.gpu)
+        # Multi-device placement, dynamic swap if not in high VRAM mode, or the whole model on GPU
+        self.place_transformer()
         
         print(f"{self.model_name} Transformer Loaded from {path_to_load}.")
         return self.transformer
@@ -8,7 +8,6 @@ import pathlib
 from PIL import Image
 
 from diffusers_helper.models.hunyuan_video_packed import HunyuanVideoTransformer3DModelPacked
-from diffusers_helper.memory import DynamicSwapInstaller
 from diffusers_helper.utils import resize_and_center_crop
 from diffusers_helper.bucket_tools import find_nearest_bucket
 from diffusers_helper.hunyuan import vae_encode, vae_decode
@@ -72,13 +71,10 @@ class VideoBaseModelGenerator(BaseModelGenerator):
         self.transformer.eval()
         self.transformer.to(dtype=torch.bfloat16)
         self.transformer.requires_grad_(False)
+        self.apply_transformer_optimizations()
         
-        # Set up dynamic swap if not in high VRAM mode
-        if not self.high_vram:
-            DynamicSwapInstaller.install_model(self.transformer, device=self.gpu)
-        else:
-            # In high VRAM mode, move the entire model to GPU
-            self.transformer.to(device=self.gpu)
+        # Multi-device placement, dynamic swap if not in high VRAM mode, or the whole model on GPU
+        self.place_transformer()
         
         print(f"{self.model_name} Transformer Loaded from {path_to_load}.")
         return self.transformer
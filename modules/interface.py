@@ -572,6 +572,8 @@ def create_interface(
                                 with gr.Row():
                                     seed = gr.Number(label="Seed", value=2500, precision=0)
                                     randomize_seed = gr.Checkbox(label="Randomize", value=True, info="Generate a new random seed for each job")
+                                    variants = gr.Slider(label="Variants", minimum=1, maximum=8, value=1, step=1, info="Videos generated from consecutive seeds in one batch. Encoding and model loading are shared; uses more VRAM. Original and F1 models only.")
+                                    draft = gr.Checkbox(label="Draft", value=False, info="Quick low-quality take at a smaller resolution and fewer steps with aggressive caching. Promote it later to re-run at full quality.")
                             with gr.Accordion("LoRAs", open=False):
                                 with gr.Row():
                                     lora_selector = gr.Dropdown(
@@ -685,6 +687,7 @@ def create_interface(
                                 "<p style='color: red; text-align: center;'>Input video required</p>", visible=False
                             )
                             end_button = gr.Button(value="❌ Cancel Current Job", interactive=True, visible=False)
+                            promote_draft_button = gr.Button(value="⬆️ Promote Draft", variant="secondary")
 
            
 
@@ -1018,6 +1021,191 @@ def create_interface(
                             )
                             # The reset_system_prompt_btn is now defined above within the Row
 
+                        with gr.Accordion("Performance", open=False):
+                            sampler = gr.Dropdown(
+                                label="Sampler",
+                                choices=["unipc", "unipc_bh2", "euler", "heun", "dpmpp_2m", "dpmpp_3m", "picard"],
+                                value=settings.get("sampler", "unipc"),
+                                info="Solver used for the denoising steps. The higher-order multistep solvers (dpmpp_3m, unipc) hold up best at reduced step counts. Heun calls the model twice per step. Picard runs Euler steps in parallel batches (needs spare VRAM, disables step caches)."
+                            )
+                            with gr.Row():
+                                parallel_window_size = gr.Number(
+                                    label="Picard window size",
+                                    value=settings.get("parallel_window_size", 8),
+                                    minimum=1, step=1, precision=0,
+                                    info="Steps denoised together in one batch by the Picard sampler. Memory grows with the window."
+                                )
+                                parallel_tolerance = gr.Number(
+                                    label="Picard tolerance",
+                                    value=settings.get("parallel_tolerance", 0.01),
+                                    minimum=0.0, step=0.005,
+                                    info="RMS latent change below which a step counts as converged. Lower is closer to plain Euler but needs more iterations."
+                                )
+                            with gr.Row():
+                                progressive_low_res_steps = gr.Number(
+                                    label="Low resolution steps",
+                                    value=settings.get("progressive_low_res_steps", 0),
+                                    minimum=0, step=1, precision=0,
+                                    info="Run the first N (high noise) steps of every section at a reduced resolution, then upscale, re-noise and finish at full resolution. 0 disables."
+                                )
+                                progressive_low_res_scale = gr.Slider(
+                                    label="Low resolution scale",
+                                    minimum=0.25, maximum=1.0, step=0.05,
+                                    value=settings.get("progressive_low_res_scale", 0.5),
+                                    info="Size of the low resolution steps relative to the output (0.5 = a quarter of the tokens)."
+                                )
+                            with gr.Row():
+                                early_exit_tolerance = gr.Number(
+                                    label="Early exit tolerance",
+                                    value=settings.get("early_exit_tolerance", 0.0),
+                                    minimum=0, step=0.005,
+                                    info="UniPC only. Finish a section early once the predicted final latent changes less than this (relative) between steps. 0 disables."
+                                )
+                                early_exit_min_steps = gr.Number(
+                                    label="Early exit minimum steps",
+                                    value=settings.get("early_exit_min_steps", 10),
+                                    minimum=1, step=1, precision=0,
+                                    info="Steps that always run before early exit is considered."
+                                )
+                            batch_cfg = gr.Checkbox(
+                                label="Batch CFG branches",
+                                value=settings.get("batch_cfg", False),
+                                info="When CFG Scale is not 1, run the positive and negative passes as one batched forward. Faster, especially with low VRAM, but uses more activation memory."
+                            )
+                            with gr.Row():
+                                cfg_interval_low = gr.Slider(
+                                    label="CFG interval start (sigma)",
+                                    minimum=0.0, maximum=1.0, step=0.01,
+                                    value=settings.get("cfg_interval_low", 0.0),
+                                    info="When CFG Scale is not 1, the negative pass only runs while the noise level is between these values. Sigma goes from 1 (pure noise) to 0."
+                                )
+                                cfg_interval_high = gr.Slider(
+                                    label="CFG interval end (sigma)",
+                                    minimum=0.0, maximum=1.0, step=0.01,
+                                    value=settings.get("cfg_interval_high", 1.0),
+                                    info="[⬆️ **Faster** when narrowed] e.g. 0.2 to 0.9 skips the negative pass on the first and last steps."
+                                )
+                            cross_job_batch_size = gr.Number(
+                                label="Cross-job batch size",
+                                value=settings.get("cross_job_batch_size", 1),
+                                precision=0,
+                                minimum=1,
+                                info="Denoise up to this many queued jobs together when they differ only in prompt and seed (Original, Original with Endframe and F1 models). Raises GPU utilization on high-VRAM cards; memory grows with the batch. 1 = off."
+                            )
+                            fuse_qkv = gr.Checkbox(
+                                label="Fuse QKV projections",
+                                value=settings.get("fuse_qkv", False),
+                                info="Concatenate the attention query/key/value weights so each attention layer runs one projection matmul. Applied when the model is loaded; automatically undone when LoRAs are used."
+                            )
+                            weight_quantization = gr.Dropdown(
+                                label="Transformer weight quantization",
+                                choices=["None", "int8", "fp8"],
+                                value=settings.get("weight_quantization", "None"),
+                                info="Store transformer block weights as per-channel int8 or fp8 and dequantize on the fly. Halves weight transfers in low-VRAM mode at a small quality cost. Applied when the model is loaded; undone (with rounding kept) when LoRAs are used."
+                            )
+                            with gr.Row():
+                                first_block_cache = gr.Checkbox(
+                                    label="Use First Block Cache",
+                                    value=settings.get("first_block_cache", False),
+                                    info="Skip steps whose first transformer block output barely changed, reusing the rest of the model's last result. Needs no calibration, works at any resolution and step count. Replaces the MagCache/TeaCache choice on the Generate tab."
+                                )
+                                first_block_cache_threshold = gr.Slider(
+                                    label="First Block Cache Threshold",
+                                    minimum=0.01, maximum=0.5, step=0.01,
+                                    value=settings.get("first_block_cache_threshold", 0.08),
+                                    info="[⬆️ **Faster**] Relative change of the first block residual below which a step is skipped"
+                                )
+                            with gr.Row():
+                                block_delta_cache = gr.Checkbox(
+                                    label="Use Block Delta Cache",
+                                    value=settings.get("block_delta_cache", False),
+                                    info="Skip individual transformer blocks whose output residual barely changed between steps, while the rest of the model is still computed. Keeps one residual per cached block in VRAM. Replaces the MagCache/TeaCache choice on the Generate tab."
+                                )
+                                block_delta_cache_threshold = gr.Slider(
+                                    label="Block Delta Cache Threshold",
+                                    minimum=0.01, maximum=0.5, step=0.01,
+                                    value=settings.get("block_delta_cache_threshold", 0.05),
+                                    info="[⬆️ **Faster**] Accumulated relative change of a block residual below which the block is skipped"
+                                )
+                                block_delta_cache_first_block = gr.Number(
+                                    label="Block Delta Cache First Block",
+                                    value=settings.get("block_delta_cache_first_block", 20),
+                                    minimum=0, maximum=60, step=1, precision=0,
+                                    info="Only blocks from this index on are cached (0-19 dual-stream, 20-59 single-stream). Higher uses less VRAM."
+                                )
+                            with gr.Row():
+                                compile_transformer = gr.Checkbox(
+                                    label="Compile transformer blocks",
+                                    value=settings.get("compile_transformer", False),
+                                    info="Use torch.compile on each transformer block (high-VRAM mode only). The first generation is slower while compiling."
+                                )
+                                compile_warmup = gr.Checkbox(
+                                    label="Warm up compiled blocks",
+                                    value=settings.get("compile_warmup", False),
+                                    info="Before sampling, compile the transformer blocks for the job's batch layout. Shapes are dynamic, so this covers every resolution."
+                                )
+                            context_token_budget = gr.Number(
+                                label="Context token budget",
+                                value=settings.get("context_token_budget", 0),
+                                precision=0,
+                                minimum=0,
+                                info="Maximum image tokens per transformer step (noisy window plus clean history). When exceeded, the oldest 4x and then 2x history frames are dropped. Bounds step time at large resolutions at some cost to long-range consistency. 0 = unlimited."
+                            )
+                            sparse_context_stride = gr.Number(
+                                label="Sparse context attention stride",
+                                value=settings.get("sparse_context_stride", 0),
+                                precision=0,
+                                minimum=0,
+                                info="In the single-stream blocks, generated tokens attend to only every Nth token of the 2x/4x compressed history (1x context and text stay fully visible). Speeds up long video extensions at some cost to long-range consistency. 0 or 1 = full attention."
+                            )
+                            ff_chunk_size = gr.Number(
+                                label="Feed-forward chunk size",
+                                value=settings.get("ff_chunk_size", 0),
+                                precision=0,
+                                minimum=0,
+                                info="Process the transformer feed-forward layers this many tokens at a time to lower peak VRAM at high resolutions, with the same output. 4096-8192 is a good start; 0 = off."
+                            )
+                            with gr.Row():
+                                denoise_tile_size = gr.Number(
+                                    label="Denoising tile size (px)",
+                                    value=settings.get("denoise_tile_size", 0),
+                                    precision=0,
+                                    minimum=0,
+                                    step=16,
+                                    info="Run the transformer on overlapping spatial tiles of this size and blend them, so peak VRAM no longer grows with resolution. Costs extra compute and may show seams at low overlap. Rounded down to a multiple of 16, at least 64. 0 = whole frame."
+                                )
+                                denoise_tile_overlap = gr.Number(
+                                    label="Denoising tile overlap (px)",
+                                    value=settings.get("denoise_tile_overlap", 128),
+                                    precision=0,
+                                    minimum=0,
+                                    info="Overlap between neighbouring tiles, blended with linear ramps."
+                                )
+                            layer_placement_devices = gr.Textbox(
+                                label="Transformer layer placement devices",
+                                value=settings.get("layer_placement_devices", ""),
+                                placeholder="cuda:0,cuda:1",
+                                info="Split the transformer blocks across these devices (filled in order, keeping the GPU memory preservation free on each) so the model stays resident instead of being swapped. Leave empty for single-GPU behaviour. Applied when the model is loaded."
+                            )
+                            attention_autotune = gr.Checkbox(
+                                label="Auto-select attention backend",
+                                value=settings.get("attention_autotune", False),
+                                info="Benchmark the installed attention libraries once per resolution and pick the fastest. Results are saved to .framepack/attention_backends.json."
+                            )
+                            with gr.Row():
+                                preview_every_n_steps = gr.Number(
+                                    label="Preview every N steps",
+                                    value=settings.get("preview_every_n_steps", 1),
+                                    minimum=1, step=1, precision=0,
+                                    info="Live previews are decoded in the background; decode one at most every N sampling steps."
+                                )
+                                preview_min_interval = gr.Number(
+                                    label="Minimum seconds between previews",
+                                    value=settings.get("preview_min_interval", 0.0),
+                                    minimum=0, step=0.5,
+                                    info="Skip previews requested sooner than this after the last one (0 = no time limit)."
+                                )
+
                         # --- Settings Tab Event Handlers ---
 
                         output_dir = gr.Textbox(
@@ -1162,6 +1350,37 @@ def create_interface(
                         # NEW: latents display position setting
                         latents_display_top.change(lambda v: handle_individual_setting_change("latents_display_top", v, "Latents Display Position"), inputs=[latents_display_top], outputs=[status])
 
+                        # Performance settings
+                        sampler.change(lambda v: handle_individual_setting_change("sampler", v, "Sampler"), inputs=[sampler], outputs=[status])
+                        progressive_low_res_steps.change(lambda v: handle_individual_setting_change("progressive_low_res_steps", v, "Low resolution steps"), inputs=[progressive_low_res_steps], outputs=[status])
+                        progressive_low_res_scale.change(lambda v: handle_individual_setting_change("progressive_low_res_scale", v, "Low resolution scale"), inputs=[progressive_low_res_scale], outputs=[status])
+                        parallel_window_size.change(lambda v: handle_individual_setting_change("parallel_window_size", v, "Picard window size"), inputs=[parallel_window_size], outputs=[status])
+                        parallel_tolerance.change(lambda v: handle_individual_setting_change("parallel_tolerance", v, "Picard tolerance"), inputs=[parallel_tolerance], outputs=[status])
+                        early_exit_tolerance.change(lambda v: handle_individual_setting_change("early_exit_tolerance", v, "Early exit tolerance"), inputs=[early_exit_tolerance], outputs=[status])
+                        early_exit_min_steps.change(lambda v: handle_individual_setting_change("early_exit_min_steps", v, "Early exit minimum steps"), inputs=[early_exit_min_steps], outputs=[status])
+                        cfg_interval_low.change(lambda v: handle_individual_setting_change("cfg_interval_low", v, "CFG interval start"), inputs=[cfg_interval_low], outputs=[status])
+                        cfg_interval_high.change(lambda v: handle_individual_setting_change("cfg_interval_high", v, "CFG interval end"), inputs=[cfg_interval_high], outputs=[status])
+                        batch_cfg.change(lambda v: handle_individual_setting_change("batch_cfg", v, "Batch CFG branches"), inputs=[batch_cfg], outputs=[status])
+                        cross_job_batch_size.change(lambda v: handle_individual_setting_change("cross_job_batch_size", max(int(v or 1), 1), "Cross-job batch size"), inputs=[cross_job_batch_size], outputs=[status])
+                        fuse_qkv.change(lambda v: handle_individual_setting_change("fuse_qkv", v, "Fuse QKV projections"), inputs=[fuse_qkv], outputs=[status])
+                        weight_quantization.change(lambda v: handle_individual_setting_change("weight_quantization", v, "Transformer weight quantization"), inputs=[weight_quantization], outputs=[status])
+                        first_block_cache.change(lambda v: handle_individual_setting_change("first_block_cache", v, "Use First Block Cache"), inputs=[first_block_cache], outputs=[status])
+                        first_block_cache_threshold.change(lambda v: handle_individual_setting_change("first_block_cache_threshold", v, "First Block Cache Threshold"), inputs=[first_block_cache_threshold], outputs=[status])
+                        block_delta_cache.change(lambda v: handle_individual_setting_change("block_delta_cache", v, "Use Block Delta Cache"), inputs=[block_delta_cache], outputs=[status])
+                        block_delta_cache_threshold.change(lambda v: handle_individual_setting_change("block_delta_cache_threshold", v, "Block Delta Cache Threshold"), inputs=[block_delta_cache_threshold], outputs=[status])
+                        block_delta_cache_first_block.change(lambda v: handle_individual_setting_change("block_delta_cache_first_block", v, "Block Delta Cache First Block"), inputs=[block_delta_cache_first_block], outputs=[status])
+                        compile_transformer.change(lambda v: handle_individual_setting_change("compile_transformer", v, "Compile transformer blocks"), inputs=[compile_transformer], outputs=[status])
+                        compile_warmup.change(lambda v: handle_individual_setting_change("compile_warmup", v, "Warm up compiled blocks"), inputs=[compile_warmup], outputs=[status])
+                        context_token_budget.change(lambda v: handle_individual_setting_change("context_token_budget", int(v or 0), "Context token budget"), inputs=[context_token_budget], outputs=[status])
+                        sparse_context_stride.change(lambda v: handle_individual_setting_change("sparse_context_stride", int(v or 0), "Sparse context attention stride"), inputs=[sparse_context_stride], outputs=[status])
+                        ff_chunk_size.change(lambda v: handle_individual_setting_change("ff_chunk_size", int(v or 0), "Feed-forward chunk size"), inputs=[ff_chunk_size], outputs=[status])
+                        denoise_tile_size.change(lambda v: handle_individual_setting_change("denoise_tile_size", int(v or 0), "Denoising tile size"), inputs=[denoise_tile_size], outputs=[status])
+                        denoise_tile_overlap.change(lambda v: handle_individual_setting_change("denoise_tile_overlap", int(v or 0), "Denoising tile overlap"), inputs=[denoise_tile_overlap], outputs=[status])
+                        layer_placement_devices.change(lambda v: handle_individual_setting_change("layer_placement_devices", v, "Transformer layer placement devices"), inputs=[layer_placement_devices], outputs=[status])
+                        attention_autotune.change(lambda v: handle_individual_setting_change("attention_autotune", v, "Auto-select attention backend"), inputs=[attention_autotune], outputs=[status])
+                        preview_every_n_steps.change(lambda v: handle_individual_setting_change("preview_every_n_steps", v, "Preview every N steps"), inputs=[preview_every_n_steps], outputs=[status])
+                        preview_min_interval.change(lambda v: handle_individual_setting_change("preview_min_interval", v, "Minimum seconds between previews"), inputs=[preview_min_interval], outputs=[status])
+
 
 
                         # Connect the latents display setting to layout updates  
@@ -1290,6 +1509,8 @@ def create_interface(
              resolutionW_arg, resolutionH_arg,
              combine_with_source_arg, 
              num_cleaned_frames_arg,
+             variants_arg,
+             draft_arg,
              lora_names_states_arg,   # This is from lora_names_states (gr.State)
              *lora_slider_values_tuple # Remaining args are LoRA slider values
             ) = args
@@ -1331,6 +1552,8 @@ def create_interface(
                                 input_image_path, 
                                 combine_with_source_arg,
                                 num_cleaned_frames_arg,
+                                variants_arg,
+                                draft_arg,
                                 lora_names_states_arg,
                                 *lora_slider_values_tuple
                                )
@@ -1434,6 +1657,8 @@ def create_interface(
             resolutionH,                # Corresponds to resolutionH_arg
             combine_with_source,        # Corresponds to combine_with_source_arg
             num_cleaned_frames,         # Corresponds to num_cleaned_frames_arg
+            variants,                   # Corresponds to variants_arg
+            draft,                      # Corresponds to draft_arg
             lora_names_states           # Corresponds to lora_names_states_arg
         ]
         # Add LoRA sliders to the input list
@@ -1708,6 +1933,18 @@ def create_interface(
             outputs=[top_preview_row, preview_image]
         )
         
+        # Promote re-queues the draft job shown in the Current Job ID box at full quality
+        def promote_draft_job(job_id):
+            if job_id:
+                job_queue.promote_draft_job(job_id)
+            return update_stats()
+
+        promote_draft_button.click(
+            fn=promote_draft_job,
+            inputs=[current_job_id],
+            outputs=[queue_status, queue_stats_display]
+        )
+
         load_queue_button.click(
             fn=load_queue_from_json,
             inputs=[],
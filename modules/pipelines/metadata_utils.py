@@ -204,6 +204,11 @@ def create_metadata(job_params, job_id, settings, save_placeholder=False):
         "blend_sections": job_params.get('blend_sections', 4),
         "latent_window_size": job_params.get('latent_window_size', 9),
         "num_cleaned_frames": job_params.get('num_cleaned_frames', 5),
+        "variants": job_params.get('variants', 1),
+        "draft": job_params.get('draft', False),
+        "full_resolutionW": job_params.get('full_resolutionW', job_params.get('resolutionW', 640)),
+        "full_resolutionH": job_params.get('full_resolutionH', job_params.get('resolutionH', 640)),
+        "full_steps": job_params.get('full_steps', job_params.get('steps', 25)),
         
         # Endframe-related parameters
         "end_frame_strength": job_params.get('end_frame_strength', None),
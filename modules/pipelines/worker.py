@@ -9,12 +9,15 @@ import datetime
 from PIL import Image
 from PIL.PngImagePlugin import PngInfo
 from diffusers_helper.models.mag_cache import MagCache
-from diffusers_helper.utils import save_bcthw_as_mp4, generate_timestamp, resize_and_center_crop
+from diffusers_helper.models.first_block_cache import FirstBlockCache
+from diffusers_helper.models.block_delta_cache import BlockDeltaCache
+from diffusers_helper.models.hunyuan_video_packed import attention_registry
+from diffusers_helper.utils import save_bcthw_as_mp4, generate_timestamp, resize_and_center_crop, repeat_to_batch_size
 from diffusers_helper.memory import cpu, gpu, move_model_to_device_with_memory_preservation, offload_model_from_device_for_memory_preservation, fake_diffusers_current_device, unload_complete_models, load_model_as_complete
-from diffusers_helper.thread_utils import AsyncStream
+from diffusers_helper.thread_utils import AsyncStream, LatestWinsWorker
 from diffusers_helper.gradio.progress_bar import make_progress_bar_html
 from diffusers_helper.hunyuan import vae_decode
-from modules.video_queue import JobStatus
+from modules.video_queue import JobStatus, VideoJobQueue
 from modules.prompt_handler import parse_timestamped_prompt
 from modules.generators import create_model_generator
 from modules.pipelines.video_tools import combine_videos_sequentially_from_tensors
@@ -53,6 +56,14 @@ def get_cached_or_encode_prompt(prompt, text_encoder, text_encoder_2, tokenizer,
         # Return embeddings already on the target device (as encode_prompt_conds uses the model's device)
         return llama_vec, llama_attention_mask, clip_l_pooler
 
+
+def draft_resolution(resolutionW, resolutionH, settings):
+    """
+    Returns the (width, height) a draft job is generated at.
+    """
+    draft_scale = float(settings.get("draft_resolution_scale", 0.5))
+    return max(int(resolutionW * draft_scale), 128), max(int(resolutionH * draft_scale), 128)
+
 @torch.no_grad()
 def worker(
     model_type,
@@ -92,7 +103,10 @@ def worker(
     input_video=None,     # Add input_video parameter with default value of None
     combine_with_source=None,  # Add combine_with_source parameter
     num_cleaned_frames=5,  # Add num_cleaned_frames parameter with default value
-    save_metadata_checked=True  # Add save_metadata_checked parameter
+    save_metadata_checked=True,  # Add save_metadata_checked parameter
+    batch_companions=None,  # Queued jobs denoised in the same batch as this one (see VideoJobQueue.find_batch_companions)
+    variants=1,  # Number of videos generated from consecutive seeds in the same batch
+    draft=False  # Reduced resolution/steps with aggressive caching; promote re-runs the job at full quality
 ):
     """
     Worker function for video generation.
@@ -131,6 +145,14 @@ def worker(
     
     stream_to_use = job_stream if job_stream is not None else stream
 
+    # Draft mode: the job parameters (kept by the queue for promotion) are left untouched;
+    # only this run uses a smaller bucket and fewer steps
+    full_quality_params = {'resolutionW': resolutionW, 'resolutionH': resolutionH, 'steps': steps}
+    if draft:
+        resolutionW, resolutionH = draft_resolution(resolutionW, resolutionH, settings)
+        steps = min(steps, int(settings.get("draft_steps", 12)))
+        print(f"Worker: draft mode, generating at resolution {resolutionW}x{resolutionH} with {steps} steps")
+
     total_latent_sections = (total_second_length * 30) / (latent_window_size * 4)
     total_latent_sections = int(max(round(total_latent_sections), 1))
 
@@ -144,6 +166,46 @@ def worker(
     prompt_sections = parse_timestamped_prompt(prompt_text, total_second_length, latent_window_size, model_type)
     job_id = generate_timestamp()
 
+    # Cross-job batching: every lane is one job, and all lanes are denoised together as one batch.
+    # Companion jobs share all parameters with this job except the prompts and seed; their
+    # outputs are saved under their own job IDs and reported to their own streams.
+    lanes = [dict(job_id=job_id, prompt_text=prompt_text, n_prompt=n_prompt, seed=seed, prompt_sections=prompt_sections,
+                  generator=random_generator, stream=stream_to_use, history_pixels=None)]
+    for companion in batch_companions or []:
+        lanes.append(dict(
+            job_id=generate_timestamp(),
+            prompt_text=companion['prompt_text'],
+            n_prompt=companion['n_prompt'],
+            seed=companion['seed'],
+            prompt_sections=parse_timestamped_prompt(companion['prompt_text'], total_second_length, latent_window_size, model_type),
+            generator=torch.Generator("cpu").manual_seed(companion['seed']),
+            stream=companion['job_stream'],
+            history_pixels=None,
+        ))
+
+    # Seed variants: every job gets extra lanes with consecutive seeds and the same prompts. They are
+    # saved under their own job IDs; only the job's own lane reports files to its stream.
+    variants = max(int(variants or 1), 1)
+    if variants > 1 and model_type not in VideoJobQueue.BATCHABLE_MODEL_TYPES:
+        print(f"Worker: variants are not supported for {model_type}, generating a single video")
+        variants = 1
+    for lane in list(lanes):
+        for variant_index in range(1, variants):
+            variant_seed = lane['seed'] + variant_index
+            lanes.append({**lane, 'job_id': generate_timestamp(), 'seed': variant_seed,
+                          'generator': torch.Generator("cpu").manual_seed(variant_seed), 'is_variant': True})
+    batch_size = len(lanes)
+    if batch_size > 1:
+        print(f"Worker: denoising {batch_size} videos in one batch with seeds {[lane['seed'] for lane in lanes]}")
+
+    def mark_cancelled_lanes():
+        # Cancelling a running companion job pushes 'end' to its own stream. Its lanes stay in the
+        # batch (the latents are stacked) but are no longer decoded or saved.
+        for lane in lanes:
+            if lane['stream'] is not stream_to_use and not lane.get('cancelled') and lane['stream'].input_queue.top() == 'end':
+                lane['cancelled'] = True
+                print(f"Worker: batched job lane {lane['job_id']} (seed {lane['seed']}) was cancelled, dropping its output")
+
     # Initialize progress data with a clear starting message and dummy preview
     dummy_preview = np.zeros((64, 64, 3), dtype=np.uint8)
     initial_progress_data = {
@@ -179,6 +241,8 @@ def worker(
         main_stream.output_queue.push(('job_id', job_id))
         main_stream.output_queue.push(('monitor_job', job_id))
 
+    preview_worker = None
+
     try:
         # Create a settings dictionary for the pipeline
         pipeline_settings = {
@@ -230,6 +294,11 @@ def worker(
             'end_frame_image_path': end_frame_image_path,
             'combine_with_source': combine_with_source,
             'num_cleaned_frames': num_cleaned_frames,
+            'draft': draft,
+            # Resolution and steps the job runs at when promoted; the same as above for full quality jobs
+            'full_resolutionW': full_quality_params['resolutionW'],
+            'full_resolutionH': full_quality_params['resolutionH'],
+            'full_steps': full_quality_params['steps'],
             'save_metadata_checked': save_metadata_checked # Ensure it's in job_params for internal use
         }
         
@@ -278,6 +347,9 @@ def worker(
         # Load the transformer model
         studio_module.current_generator.load_model()
         
+        # A transformer split across devices stays resident; it must not be moved or offloaded as a whole
+        transformer_is_placed = studio_module.current_generator.transformer.layer_devices is not None
+
         # Ensure the model has no LoRAs loaded
         print(f"Ensuring {model_type} model has no LoRAs loaded")
         studio_module.current_generator.unload_loras()
@@ -296,13 +368,16 @@ def worker(
                 # Import the save_job_start_image function from metadata_utils
                 from modules.pipelines.metadata_utils import save_job_start_image, create_metadata
                 
-                # Create comprehensive metadata for the job
-                metadata_dict = create_metadata(job_params, job_id, settings)
-                
-                # Save the starting image with metadata
-                save_job_start_image(job_params, job_id, settings)
-                
-                print(f"Saved metadata and starting image for job {job_id}")
+                for lane in lanes:
+                    lane_params = {**job_params, 'prompt_text': lane['prompt_text'], 'n_prompt': lane['n_prompt'], 'seed': lane['seed'], 'variants': 1}
+
+                    # Create comprehensive metadata for the job
+                    metadata_dict = create_metadata(lane_params, lane['job_id'], settings)
+
+                    # Save the starting image with metadata
+                    save_job_start_image(lane_params, lane['job_id'], settings)
+
+                    print(f"Saved metadata and starting image for job {lane['job_id']}")
             except Exception as e:
                 print(f"Error saving starting image and metadata: {e}")
                 traceback.print_exc()
@@ -317,9 +392,10 @@ def worker(
 
         # PROMPT BLENDING: Pre-encode all prompts and store in a list in order
         unique_prompts = []
-        for section in prompt_sections:
-            if section.prompt not in unique_prompts:
-                unique_prompts.append(section.prompt)
+        for lane in lanes:
+            for section in lane['prompt_sections']:
+                if section.prompt not in unique_prompts:
+                    unique_prompts.append(section.prompt)
 
         encoded_prompts = {}
         for prompt in unique_prompts:
@@ -330,12 +406,13 @@ def worker(
             encoded_prompts[prompt] = (llama_vec, llama_attention_mask, clip_l_pooler)
 
         # PROMPT BLENDING: Build a list of (start_section_idx, prompt) for each prompt
-        prompt_change_indices = []
-        last_prompt = None
-        for idx, section in enumerate(prompt_sections):
-            if section.prompt != last_prompt:
-                prompt_change_indices.append((idx, section.prompt))
-                last_prompt = section.prompt
+        for lane in lanes:
+            lane['prompt_change_indices'] = []
+            last_prompt = None
+            for idx, section in enumerate(lane['prompt_sections']):
+                if section.prompt != last_prompt:
+                    lane['prompt_change_indices'].append((idx, section.prompt))
+                    last_prompt = section.prompt
 
         # Encode negative prompt
         if cfg == 1:
@@ -345,12 +422,15 @@ def worker(
                 torch.zeros_like(encoded_prompts[prompt_sections[0].prompt][2])
             )
         else:
-             # Use the helper function for caching and encoding negative prompt
-            # Ensure n_prompt is a string
-            n_prompt_str = str(n_prompt) if n_prompt is not None else ""
-            llama_vec_n, llama_attention_mask_n, clip_l_pooler_n = get_cached_or_encode_prompt(
-                n_prompt_str, text_encoder, text_encoder_2, tokenizer, tokenizer_2, gpu, prompt_embedding_cache
-            )
+            negative_prompts = []
+            for lane in lanes:
+                # Use the helper function for caching and encoding negative prompt
+                # Ensure n_prompt is a string
+                n_prompt_str = str(lane['n_prompt']) if lane['n_prompt'] is not None else ""
+                negative_prompts.append(get_cached_or_encode_prompt(
+                    n_prompt_str, text_encoder, text_encoder_2, tokenizer, tokenizer_2, gpu, prompt_embedding_cache
+                ))
+            llama_vec_n, llama_attention_mask_n, clip_l_pooler_n = [torch.cat(x) for x in zip(*negative_prompts)]
 
         end_of_input_video_embedding = None # Video model end frame CLIP Vision embedding
         # Process input image or video based on model type
@@ -426,10 +506,10 @@ def worker(
 
                 # Create a random latent to serve as the initial VAE context anchor.
                 # This provides a random starting point without visual bias.
-                start_latent = torch.randn(
+                start_latent = torch.cat([torch.randn(
                     (1, 16, 1, height // 8, width // 8),
-                    generator=random_generator, device=random_generator.device
-                ).to(device=gpu, dtype=torch.float32)
+                    generator=lane['generator'], device=lane['generator'].device
+                ) for lane in lanes]).to(device=gpu, dtype=torch.float32)
 
                 # Create a neutral black image to generate a valid "null" CLIP Vision embedding.
                 # This provides the model with a valid, in-distribution unconditional image prompt.
@@ -537,6 +617,10 @@ def worker(
         clip_l_pooler_n = clip_l_pooler_n.to(studio_module.current_generator.transformer.dtype)
         image_encoder_last_hidden_state = image_encoder_last_hidden_state.to(studio_module.current_generator.transformer.dtype)
 
+        # Conditioning shared by all lanes is expanded to the batch
+        image_encoder_last_hidden_state = repeat_to_batch_size(image_encoder_last_hidden_state, batch_size)
+        start_latent = repeat_to_batch_size(start_latent, batch_size)
+
         # Sampling
         stream_to_use.output_queue.push(('progress', (None, '', make_progress_bar_html(0, 'Start sampling ...'))))
 
@@ -547,7 +631,7 @@ def worker(
 
         # Initialize history latents based on model type
         if model_type != "Video" and model_type != "Video F1":  # Skip for Video models as we already initialized it
-            history_latents = studio_module.current_generator.prepare_history_latents(height, width)
+            history_latents = repeat_to_batch_size(studio_module.current_generator.prepare_history_latents(height, width), batch_size)
             
             # For F1 model, initialize with start latent
             if model_type == "F1":
@@ -570,9 +654,44 @@ def worker(
             lora_folder_from_settings = settings.get("lora_dir")
             studio_module.current_generator.load_loras(selected_loras, lora_folder_from_settings, lora_loaded_names, lora_values)
 
+        # Live previews are decoded on a background thread so the GPU sync and host copy do not stall
+        # the sampler. Previews are rate limited, and one still being decoded is replaced by a newer one.
+        preview_every_n_steps = max(int(settings.get("preview_every_n_steps", 1)), 1)
+        preview_min_interval = float(settings.get("preview_min_interval", 0.0))
+        last_preview_time = None
+        latest_preview = None
+        # Denoised estimate of the last step when its preview was throttled, and the last progress text
+        unsent_preview = None
+        last_progress_text = None
+
+        def render_preview(denoised):
+            nonlocal latest_preview
+            from diffusers_helper.hunyuan import vae_decode_fake
+            preview = vae_decode_fake(denoised)
+            preview = (preview * 255.0).detach().cpu().numpy().clip(0, 255).astype(np.uint8)
+            latest_preview = einops.rearrange(preview, 'b c t h w -> (b h) (t w) c')
+
+        preview_worker = LatestWinsWorker(render_preview)
+
+        def flush_final_preview():
+            # Previews the sampler's real final step of the section (throttled away or still decoding)
+            nonlocal unsent_preview
+            if last_progress_text is None:
+                return
+            if unsent_preview is not None:
+                preview_worker.submit(unsent_preview)
+                unsent_preview = None
+            preview_worker.flush()
+
+            desc, html = last_progress_text
+            stream_to_use.output_queue.push(('progress', (latest_preview, desc, html)))
+            from __main__ import stream as main_stream
+            if main_stream:
+                main_stream.output_queue.push(('progress', (latest_preview, desc, html)))
+
             # --- Callback for progress ---
         def callback(d):
-            nonlocal last_step_time, step_durations
+            nonlocal last_step_time, step_durations, last_preview_time, unsent_preview, last_progress_text
             
             # Check for cancellation signal
             if stream_to_use.input_queue.top() == 'end':
@@ -590,15 +709,22 @@ def worker(
             last_step_time = now_time
             avg_step = sum(step_durations) / len(step_durations) if step_durations else 0.0
 
-            preview = d['denoised']
-            from diffusers_helper.hunyuan import vae_decode_fake
-            preview = vae_decode_fake(preview)
-            preview = (preview * 255.0).detach().cpu().numpy().clip(0, 255).astype(np.uint8)
-            preview = einops.rearrange(preview, 'b c t h w -> (b h) (t w) c')
-
             # --- Progress & ETA logic ---
             # Current segment progress
             current_step = d['i'] + 1
+
+            # The final step of a section is previewed by flush_final_preview(), since early exit and
+            # progressive resolution mean the sampler's last step is not always step `steps`
+            if (current_step % preview_every_n_steps == 0
+                    and (last_preview_time is None or now_time - last_preview_time >= preview_min_interval)):
+                last_preview_time = now_time
+                preview_worker.submit(d['denoised'])
+                unsent_preview = None
+            else:
+                unsent_preview = d['denoised']
+            # The most recent finished preview; None until the first one is decoded
+            preview = latest_preview
+
             percentage = int(100.0 * current_step / steps)
 
             # Total progress
@@ -659,6 +785,8 @@ def worker(
                 except Exception as e:
                     print(f"Error updating job progress data: {e}")
                     
+            last_progress_text = (desc, make_progress_bar_html(percentage, segment_hint) + make_progress_bar_html(total_percentage, total_hint))
+
             # Always push to the job-specific stream
             stream_to_use.output_queue.push(('progress', (preview, desc, make_progress_bar_html(percentage, segment_hint) + make_progress_bar_html(total_percentage, total_hint))))
             
@@ -677,6 +805,8 @@ def worker(
         magcache = None
         # RT_BORG: I cringe at this, but refactoring to introduce an actual model class will fix it.
         model_family = "F1" if "F1" in model_type else "Original"
+        studio_module.current_generator.transformer.uninstall_first_block_cache()
+        studio_module.current_generator.transformer.uninstall_block_delta_cache()
 
         if settings.get("calibrate_magcache"): # Calibration mode (forces MagCache on)
             print("Setting Up MagCache for Calibration")
@@ -684,6 +814,25 @@ def worker(
             studio_module.current_generator.transformer.initialize_teacache(enable_teacache=False) # Ensure TeaCache is off
             magcache = MagCache(model_family=model_family, height=height, width=width, num_steps=steps, is_calibrating=is_calibrating, threshold=magcache_threshold, max_consectutive_skips=magcache_max_consecutive_skips, retention_ratio=magcache_retention_ratio)
             studio_module.current_generator.transformer.install_magcache(magcache)
+        elif draft: # Drafts skip steps aggressively, whatever the cache selection
+            print("Setting Up First Block Cache for draft")
+            studio_module.current_generator.transformer.initialize_teacache(enable_teacache=False) # Ensure TeaCache is off
+            studio_module.current_generator.transformer.uninstall_magcache()
+            first_block_cache = FirstBlockCache(num_steps=steps, threshold=settings.get("draft_cache_threshold", 0.15), max_consecutive_skips=4, retention_ratio=0.1)
+            studio_module.current_generator.transformer.install_first_block_cache(first_block_cache)
+        elif settings.get("first_block_cache", False): # First Block Cache overrides the per-job cache selection
+            print("Setting Up First Block Cache")
+            studio_module.current_generator.transformer.initialize_teacache(enable_teacache=False) # Ensure TeaCache is off
+            studio_module.current_generator.transformer.uninstall_magcache()
+            first_block_cache = FirstBlockCache(num_steps=steps, threshold=settings.get("first_block_cache_threshold", 0.08))
+            studio_module.current_generator.transformer.install_first_block_cache(first_block_cache)
+        elif settings.get("block_delta_cache", False): # Block Delta Cache overrides the per-job cache selection
+            print("Setting Up Block Delta Cache")
+            studio_module.current_generator.transformer.initialize_teacache(enable_teacache=False) # Ensure TeaCache is off
+            studio_module.current_generator.transformer.uninstall_magcache()
+            num_blocks = len(studio_module.current_generator.transformer.transformer_blocks) + len(studio_module.current_generator.transformer.single_transformer_blocks)
+            block_delta_cache = BlockDeltaCache(num_steps=steps, num_blocks=num_blocks, threshold=settings.get("block_delta_cache_threshold", 0.05), first_cached_block=int(settings.get("block_delta_cache_first_block", 20)))
+            studio_module.current_generator.transformer.install_block_delta_cache(block_delta_cache)
         elif use_magcache: # User selected MagCache
             print("Setting Up MagCache")
             magcache = MagCache(model_family=model_family, height=height, width=width, num_steps=steps, is_calibrating=False, threshold=magcache_threshold, max_consectutive_skips=magcache_max_consecutive_skips, retention_ratio=magcache_retention_ratio)
@@ -698,29 +847,24 @@ def worker(
             studio_module.current_generator.transformer.initialize_teacache(enable_teacache=False)
             studio_module.current_generator.transformer.uninstall_magcache()
 
-        # --- Main generation loop ---
-        # `i_section_loop` will be our loop counter for applying end_frame_latent
-        for i_section_loop, latent_padding in enumerate(latent_paddings): # Existing loop structure
-            is_last_section = latent_padding == 0
-            latent_padding_size = latent_padding * latent_window_size
+        # Attention backends are benchmarked per shape on first use when autotuning is on
+        attention_registry.autotune = settings.get("attention_autotune", False)
 
-            if stream_to_use.input_queue.top() == 'end':
-                stream_to_use.output_queue.push(('end', None))
-                return
+        transformer = studio_module.current_generator.transformer
+        transformer.context_token_budget = int(settings.get("context_token_budget", 0)) or None
+        transformer.sparse_context_stride = int(settings.get("sparse_context_stride", 0)) or None
+        transformer.set_ff_chunk_size(int(settings.get("ff_chunk_size", 0)))
 
-            # Calculate the current time position
-            if model_type == "Video":
-                # For Video model, add the input video time to the current position
-                input_video_time = input_video_frame_count * 4 / 30  # Convert latent frames to time
-                current_time_position = (total_generated_latent_frames * 4 - 3) / 30  # in seconds
-                if current_time_position < 0:
-                    current_time_position = 0.01
-            else:
-                # For other models, calculate as before
-                current_time_position = (total_generated_latent_frames * 4 - 3) / 30  # in seconds
-                if current_time_position < 0:
-                    current_time_position = 0.01
+        if settings.get("compile_warmup", False) and transformer.compiled_blocks:
+            # Dynamic shapes: one warmup per batch layout (batched CFG doubles the batch) covers every bucket
+            stream_to_use.output_queue.push(('progress', (None, '', make_progress_bar_html(0, 'Compiling transformer blocks...'))))
+            transformer.warmup_compiled_blocks(
+                height, width, latent_window_size,
+                batch_size=batch_size * (2 if cfg != 1.0 and settings.get("batch_cfg", False) else 1),
+                device=gpu,
+            )
 
+        def select_section_prompt(prompt_sections, prompt_change_indices, current_time_position):
             # Find the appropriate prompt for this section
             current_prompt = prompt_sections[0].prompt  # Default to first prompt
             for section in prompt_sections:
@@ -778,6 +922,38 @@ def worker(
             else:
                 llama_vec, llama_attention_mask, clip_l_pooler = encoded_prompts[current_prompt]
 
+            return current_prompt, llama_vec, llama_attention_mask, clip_l_pooler
+
+        # --- Main generation loop ---
+        # `i_section_loop` will be our loop counter for applying end_frame_latent
+        for i_section_loop, latent_padding in enumerate(latent_paddings): # Existing loop structure
+            is_last_section = latent_padding == 0
+            latent_padding_size = latent_padding * latent_window_size
+
+            if stream_to_use.input_queue.top() == 'end':
+                stream_to_use.output_queue.push(('end', None))
+                return
+            mark_cancelled_lanes()
+
+            # Calculate the current time position
+            if model_type == "Video":
+                # For Video model, add the input video time to the current position
+                input_video_time = input_video_frame_count * 4 / 30  # Convert latent frames to time
+                current_time_position = (total_generated_latent_frames * 4 - 3) / 30  # in seconds
+                if current_time_position < 0:
+                    current_time_position = 0.01
+            else:
+                # For other models, calculate as before
+                current_time_position = (total_generated_latent_frames * 4 - 3) / 30  # in seconds
+                if current_time_position < 0:
+                    current_time_position = 0.01
+
+            # Every lane follows its own prompt schedule; the batch is stacked in lane order
+            section_prompts = [select_section_prompt(lane['prompt_sections'], lane['prompt_change_indices'], current_time_position) for lane in lanes]
+            current_prompt, llama_vec, llama_attention_mask, clip_l_pooler = section_prompts[0]
+            if batch_size > 1:
+                llama_vec, llama_attention_mask, clip_l_pooler = [torch.cat(x) for x in zip(*[p[1:] for p in section_prompts])]
+
             original_time_position = total_second_length - current_time_position
             if original_time_position < 0:
                 original_time_position = 0
@@ -838,22 +1014,35 @@ def worker(
             if not high_vram:
                 # Unload VAE etc. before loading transformer
                 unload_complete_models(vae, text_encoder, text_encoder_2, image_encoder)
-                move_model_to_device_with_memory_preservation(studio_module.current_generator.transformer, target_device=gpu, preserved_memory_gb=settings.get("gpu_memory_preservation"))
-                if selected_loras:
-                    studio_module.current_generator.move_lora_adapters_to_device(gpu)
+                if not transformer_is_placed:
+                    move_model_to_device_with_memory_preservation(studio_module.current_generator.transformer, target_device=gpu, preserved_memory_gb=settings.get("gpu_memory_preservation"))
+                    if selected_loras:
+                        studio_module.current_generator.move_lora_adapters_to_device(gpu)
 
 
             from diffusers_helper.pipelines.k_diffusion_hunyuan import sample_hunyuan
             generated_latents = sample_hunyuan(
                 transformer=studio_module.current_generator.transformer,
+                sampler=settings.get("sampler", "unipc"),
                 width=width,
                 height=height,
                 frames=num_frames,
                 real_guidance_scale=cfg,
                 distilled_guidance_scale=gs,
                 guidance_rescale=rs,
+                cfg_interval=(float(settings.get("cfg_interval_low", 0.0)), float(settings.get("cfg_interval_high", 1.0))),
+                batch_cfg=settings.get("batch_cfg", False),
+                tile_size=int(settings.get("denoise_tile_size", 0)) or None,
+                tile_overlap=int(settings.get("denoise_tile_overlap", 128)),
                 num_inference_steps=steps,
-                generator=random_generator,
+                low_res_steps=int(settings.get("progressive_low_res_steps", 0)),
+                low_res_scale=float(settings.get("progressive_low_res_scale", 0.5)),
+                early_exit_tolerance=float(settings.get("early_exit_tolerance", 0.0)) or None,
+                early_exit_min_steps=int(settings.get("early_exit_min_steps", 10)),
+                parallel_window_size=int(settings.get("parallel_window_size", 8)),
+                parallel_tolerance=float(settings.get("parallel_tolerance", 0.01)),
+                batch_size=batch_size,
+                generator=[lane['generator'] for lane in lanes] if batch_size > 1 else random_generator,
                 prompt_embeds=llama_vec,
                 prompt_embeds_mask=llama_attention_mask,
                 prompt_poolers=clip_l_pooler,
@@ -872,6 +1061,7 @@ def worker(
                 clean_latent_4x_indices=clean_latent_4x_indices,
                 callback=callback,
             )
+            flush_final_preview()
 
             # RT_BORG: Observe the MagCache skip patterns during dev.
             # RT_BORG: We need to use a real logger soon!
@@ -886,35 +1076,51 @@ def worker(
             history_latents = studio_module.current_generator.update_history_latents(history_latents, generated_latents)
 
             if not high_vram:
-                if selected_loras:
-                    studio_module.current_generator.move_lora_adapters_to_device(cpu)
-                offload_model_from_device_for_memory_preservation(studio_module.current_generator.transformer, target_device=gpu, preserved_memory_gb=8)
+                if not transformer_is_placed:
+                    if selected_loras:
+                        studio_module.current_generator.move_lora_adapters_to_device(cpu)
+                    offload_model_from_device_for_memory_preservation(studio_module.current_generator.transformer, target_device=gpu, preserved_memory_gb=8)
                 load_model_as_complete(vae, target_device=gpu)
 
             # Get real history latents using the generator
             real_history_latents = studio_module.current_generator.get_real_history_latents(history_latents, total_generated_latent_frames)
 
-            if history_pixels is None:
-                history_pixels = vae_decode(real_history_latents, vae).cpu()
-            else:
-                section_latent_frames = (latent_window_size * 2 + 1) if model_type in ("Original", "Original with Endframe") and has_input_image and is_last_section else studio_module.current_generator.get_section_latent_frames(latent_window_size, is_last_section)
-                overlapped_frames = latent_window_size * 4 - 3
+            # Lanes are decoded one at a time, so VAE memory does not grow with the batch
+            mark_cancelled_lanes()
+            for lane_index, lane in enumerate(lanes):
+                if lane.get('cancelled'):
+                    continue
+                lane_history_latents = real_history_latents[lane_index:lane_index + 1]
 
-                # Get current pixels using the generator
-                current_pixels = studio_module.current_generator.get_current_pixels(real_history_latents, section_latent_frames, vae)
-                
-                # Update history pixels using the generator
-                history_pixels = studio_module.current_generator.update_history_pixels(history_pixels, current_pixels, overlapped_frames)
-                
-                print(f"{model_type} model section {section_idx+1}/{total_latent_sections}, history_pixels shape: {history_pixels.shape}")
+                if lane['history_pixels'] is None:
+                    lane['history_pixels'] = vae_decode(lane_history_latents, vae).cpu()
+                else:
+                    section_latent_frames = (latent_window_size * 2 + 1) if model_type in ("Original", "Original with Endframe") and has_input_image and is_last_section else studio_module.current_generator.get_section_latent_frames(latent_window_size, is_last_section)
+                    overlapped_frames = latent_window_size * 4 - 3
+
+                    # Get current pixels using the generator
+                    current_pixels = studio_module.current_generator.get_current_pixels(lane_history_latents, section_latent_frames, vae)
+
+                    # Update history pixels using the generator
+                    lane['history_pixels'] = studio_module.current_generator.update_history_pixels(lane['history_pixels'], current_pixels, overlapped_frames)
+
+                    print(f"{model_type} model section {section_idx+1}/{total_latent_sections}, history_pixels shape: {lane['history_pixels'].shape}")
+
+            history_pixels = lanes[0]['history_pixels']
 
             if not high_vram:
                 unload_complete_models()
 
+            for lane in lanes:
+                if lane.get('cancelled'):
+                    continue
+                lane_output_filename = os.path.join(output_dir, f"{lane['job_id']}_{total_generated_latent_frames}.mp4")
+                save_bcthw_as_mp4(lane['history_pixels'], lane_output_filename, fps=30, crf=settings.get("mp4_crf"))
+                if not lane.get('is_variant'):
+                    lane['stream'].output_queue.push(('file', lane_output_filename))
+
             output_filename = os.path.join(output_dir, f'{job_id}_{total_generated_latent_frames}.mp4')
-            save_bcthw_as_mp4(history_pixels, output_filename, fps=30, crf=settings.get("mp4_crf"))
             print(f'Decoded. Current latent shape {real_history_latents.shape}; pixel shape {history_pixels.shape}')
-            stream_to_use.output_queue.push(('file', output_filename))
 
             if is_last_section:
                 break
@@ -936,6 +1142,16 @@ def worker(
             studio_module.current_generator.transformer.uninstall_magcache()
             magcache = None
 
+        first_block_cache = studio_module.current_generator.transformer.first_block_cache
+        if first_block_cache is not None:
+            print(f"First Block Cache ({100.0 * first_block_cache.total_cache_hits / max(first_block_cache.total_cache_requests, 1):.2f}%) skipped {first_block_cache.total_cache_hits} of {first_block_cache.total_cache_requests} steps.")
+            studio_module.current_generator.transformer.uninstall_first_block_cache()
+
+        block_delta_cache = studio_module.current_generator.transformer.block_delta_cache
+        if block_delta_cache is not None:
+            print(f"Block Delta Cache ({100.0 * block_delta_cache.total_block_hits / max(block_delta_cache.total_block_requests, 1):.2f}%) skipped {block_delta_cache.total_block_hits} of {block_delta_cache.total_block_requests} cached block calls.")
+            studio_module.current_generator.transformer.uninstall_block_delta_cache()
+
         # Handle the results
         result = pipeline.handle_results(job_params, output_filename)
 
@@ -968,32 +1184,36 @@ def worker(
             )
     finally:
         # This finally block is associated with the main try block (starts around line 154)
+        if preview_worker is not None:
+            preview_worker.close()
+
         if settings.get("clean_up_videos"):
-            try:
-                video_files = [
-                    f for f in os.listdir(output_dir)
-                    if f.startswith(f"{job_id}_") and f.endswith(".mp4")
-                ]
-                print(f"Video files found for cleanup: {video_files}")
-                if video_files:
-                    def get_frame_count(filename):
-                        try:
-                            # Handles filenames like jobid_123.mp4
-                            return int(filename.replace(f"{job_id}_", "").replace(".mp4", ""))
-                        except Exception:
-                            return -1
-                    video_files_sorted = sorted(video_files, key=get_frame_count)
-                    print(f"Sorted video files: {video_files_sorted}")
-                    final_video = video_files_sorted[-1]
-                    for vf in video_files_sorted[:-1]:
-                        full_path = os.path.join(output_dir, vf)
-                        try:
-                            os.remove(full_path)
-                            print(f"Deleted intermediate video: {full_path}")
-                        except Exception as e:
-                            print(f"Failed to delete {full_path}: {e}")
-            except Exception as e:
-                print(f"Error during video cleanup: {e}")
+            for cleanup_job_id in [lane['job_id'] for lane in lanes]:
+                try:
+                    video_files = [
+                        f for f in os.listdir(output_dir)
+                        if f.startswith(f"{cleanup_job_id}_") and f.endswith(".mp4")
+                    ]
+                    print(f"Video files found for cleanup: {video_files}")
+                    if video_files:
+                        def get_frame_count(filename):
+                            try:
+                                # Handles filenames like jobid_123.mp4
+                                return int(filename.replace(f"{cleanup_job_id}_", "").replace(".mp4", ""))
+                            except Exception:
+                                return -1
+                        video_files_sorted = sorted(video_files, key=get_frame_count)
+                        print(f"Sorted video files: {video_files_sorted}")
+                        final_video = video_files_sorted[-1]
+                        for vf in video_files_sorted[:-1]:
+                            full_path = os.path.join(output_dir, vf)
+                            try:
+                                os.remove(full_path)
+                                print(f"Deleted intermediate video: {full_path}")
+                            except Exception as e:
+                                print(f"Failed to delete {full_path}: {e}")
+                except Exception as e:
+                    print(f"Error during video cleanup: {e}")
 
         # Check if the user wants to combine the source video with the generated video
         # This is done after the video cleanup routine to ensure the combined video is not deleted
@@ -1149,5 +1369,8 @@ def worker(
         if not has_loras:
             print(f"No LoRA components found in transformer")
 
+    for lane in lanes[1:]:
+        if not lane.get('is_variant'):
+            lane['stream'].output_queue.push(('end', None))
     stream_to_use.output_queue.push(('end', None))
     return
@@ -27,6 +27,38 @@ class Settings:
             "override_system_prompt": False,
             "auto_cleanup_on_startup": False, # ADDED: New setting for startup cleanup
             "latents_display_top": False, # NEW: Control latents preview position (False = right column, True = top of interface)
+            "progressive_low_res_steps": 0, # First N sampling steps run at a downscaled latent, then upscale and re-noise (0 = off)
+            "progressive_low_res_scale": 0.5, # Latent scale of the low resolution steps (0.5 = a quarter of the tokens)
+            "early_exit_tolerance": 0.0, # UniPC stops once the x0 estimate changes less than this between steps (0 = off)
+            "early_exit_min_steps": 10, # Steps always run before early exit is considered
+            "preview_every_n_steps": 1, # Decode a live preview at most every N sampling steps
+            "preview_min_interval": 0.0, # Minimum seconds between live previews
+            "sampler": "unipc", # Flow matching sampler: unipc, unipc_bh2, euler, heun, dpmpp_2m, dpmpp_3m or picard
+            "parallel_window_size": 8, # Steps batched per model call by the picard sampler
+            "parallel_tolerance": 0.01, # RMS latent change at which the picard sampler treats a step as converged
+            "cfg_interval_low": 0.0, # Real CFG (CFG Scale != 1) is only applied for sigmas in [low, high]; elsewhere only the positive pass runs
+            "cfg_interval_high": 1.0,
+            "batch_cfg": False, # Run positive and negative CFG branches in one batched transformer forward
+            "cross_job_batch_size": 1, # Max queued jobs (differing only in prompt and seed) denoised together in one batch
+            "fuse_qkv": False, # Fuse attention Q/K/V projections into a single matmul at model load
+            "draft_resolution_scale": 0.5, # Draft jobs run at this fraction of the requested resolution
+            "draft_steps": 12, # Max sampling steps for draft jobs
+            "draft_cache_threshold": 0.15, # First Block Cache threshold used for draft jobs
+            "first_block_cache": False, # Use First Block Cache instead of the per-job MagCache/TeaCache selection
+            "first_block_cache_threshold": 0.08,
+            "block_delta_cache": False, # Skip individual stable transformer blocks by reusing their cached residuals
+            "block_delta_cache_threshold": 0.05,
+            "block_delta_cache_first_block": 20, # Blocks before this index (dual-stream blocks first) are always computed
+            "weight_quantization": "None", # Weight-only quantization of transformer block linears: None, int8 or fp8
+            "compile_transformer": False, # Regional torch.compile of transformer blocks (high-VRAM mode only)
+            "compile_warmup": False, # Compile the transformer blocks for the job's batch layout before sampling
+            "context_token_budget": 0, # Max packed image tokens per step; older 4x/2x context frames are dropped to fit (0 = unlimited)
+            "sparse_context_stride": 0, # Noisy tokens attend to every Nth 2x/4x context token in single-stream blocks (0/1 = full attention)
+            "layer_placement_devices": "", # Comma-separated devices to split the transformer blocks across, e.g. "cuda:0,cuda:1"
+            "denoise_tile_size": 0, # Denoise the latent frame in overlapping spatial tiles of this many pixels (0 = whole frame)
+            "denoise_tile_overlap": 128, # Overlap in pixels between neighbouring denoising tiles
+            "ff_chunk_size": 0, # Run transformer feed-forward layers over sequence chunks of this many tokens (0 = whole sequence)
+            "attention_autotune": False, # Benchmark installed attention backends per shape and cache the fastest in .framepack
             "system_prompt_template": "{\"template\": \"<|start_header_id|>system<|end_header_id|>\\n\\nDescribe the video by detailing the following aspects: 1. The main content and theme of the video.2. The color, shape, size, texture, quantity, text, and spatial relationships of the objects.3. Actions, events, behaviors temporal relationships, physical movement changes of the objects.4. background environment, light, style and atmosphere.5. camera angles, movements, and transitions used in the video:<|eot_id|><|start_header_id|>user<|end_header_id|>\\n\\n{}<|eot_id|>\", \"crop_start\": 95}",
             "startup_model_type": "None",
             "startup_preset_name": None,
@@ -740,6 +740,22 @@ class VideoJobQueue:
         with self.lock:
             return self.jobs.get(job_id)
     
+    def promote_draft_job(self, job_id):
+        """Re-queue a draft job with the same seed and parameters at full quality. Returns the new job ID or None"""
+        job = self.get_job(job_id)
+        if job is None or not job.params.get('draft'):
+            print(f"Job {job_id} is not a draft job, nothing to promote")
+            return None
+
+        params = {**job.params, 'draft': False}
+        new_job_id = self.add_job(params)
+
+        new_job = self.get_job(new_job_id)
+        if new_job:
+            new_job.generation_type = job.generation_type
+        print(f"Promoted draft job {job_id} to full-quality job {new_job_id}")
+        return new_job_id
+    
     def get_all_jobs(self):
         """Get all jobs"""
         with self.lock:
@@ -1058,6 +1074,8 @@ class VideoJobQueue:
                         'teacache_rel_l1_thresh': job_data.get('teacache_rel_l1_thresh', 0.15),
                         'has_input_image': job_data.get('has_input_image', True),
                         'combine_with_source': job_data.get('combine_with_source', False),
+                        'variants': job_data.get('variants', 1),
+                        'draft': job_data.get('draft', False),
                     }
                     
                     # Load input image from disk if saved path exists
@@ -1355,6 +1373,112 @@ class VideoJobQueue:
                 shutil.rmtree(temp_dir)
             return 0
     
+    # Jobs denoised in one batch may only differ in these parameters
+    BATCH_VARYING_PARAMS = ('prompt_text', 'n_prompt', 'seed')
+    # Per-job file copies and originals that do not affect generation
+    BATCH_IGNORED_PARAMS = ('input_image_path', 'end_frame_image_path', 'end_frame_image_original', 'end_frame_strength_original')
+    # Video models encode and re-read their input video per job, so they always run alone
+    BATCHABLE_MODEL_TYPES = ('Original', 'Original with Endframe', 'F1')
+
+    @staticmethod
+    def _same_param(a, b):
+        if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+            return isinstance(a, np.ndarray) and isinstance(b, np.ndarray) and a.shape == b.shape and np.array_equal(a, b)
+        return a == b
+
+    def can_batch_jobs(self, job, other):
+        """Check whether two single jobs can be denoised together as one batch"""
+        if job.job_type != JobType.SINGLE or other.job_type != JobType.SINGLE:
+            return False
+        if job.params.get('model_type') not in self.BATCHABLE_MODEL_TYPES:
+            return False
+
+        ignored = set(self.BATCH_VARYING_PARAMS) | set(self.BATCH_IGNORED_PARAMS)
+        # Text-to-video jobs with the 'Noise' latent type get a random placeholder image that is never used
+        if not job.params.get('has_input_image', True) and job.params.get('latent_type') == 'Noise':
+            ignored.add('input_image')
+
+        keys = (set(job.params) | set(other.params)) - ignored
+        return all(self._same_param(job.params.get(k), other.params.get(k)) for k in keys)
+
+    def find_batch_companions(self, job, max_batch_size):
+        """
+        Find up to max_batch_size - 1 pending jobs, in queue order, that can share job's batch,
+        and take them off the queue. Must be called with self.lock held.
+        """
+        if max_batch_size <= 1:
+            return []
+
+        with self.queue.mutex:
+            queued_ids = list(self.queue.queue)
+
+        companions = []
+        for queued_id in queued_ids:
+            if len(companions) >= max_batch_size - 1:
+                break
+            other = self.jobs.get(queued_id)
+            if other is not None and other is not job and other.status == JobStatus.PENDING and self.can_batch_jobs(job, other):
+                companions.append(other)
+
+        if companions:
+            companion_ids = {companion.id for companion in companions}
+            temp_queue = []
+            while not self.queue.empty():
+                temp_queue.append(self.queue.get())
+            for item in temp_queue:
+                if item not in companion_ids:
+                    self.queue.put(item)
+                self.queue.task_done()
+
+        return companions
+
+    def _finish_batch_companions(self, companions, lead_job):
+        """
+        Settle jobs that were denoised in lead_job's batch from what the worker pushed to their streams.
+        Must be called with self.lock held.
+        """
+        requeued = []
+        for companion in companions:
+            result = None
+            ended = False
+            while True:
+                item = companion.stream.output_queue.pop()
+                if item is None:
+                    break
+                flag, data = item
+                if flag == 'file':
+                    result = data
+                elif flag == 'end':
+                    ended = True
+
+            # Companions cancelled while running keep their CANCELLED status (the worker drops their lanes)
+            if companion.status == JobStatus.RUNNING:
+                if ended and result:
+                    companion.status = JobStatus.COMPLETED
+                    companion.result = result
+                elif lead_job.status == JobStatus.CANCELLED:
+                    # Only the lead job was cancelled: unfinished companions run again on their own
+                    companion.status = JobStatus.PENDING
+                    companion.started_at = None
+                    companion.progress_data = {}
+                    requeued.append(companion.id)
+                    print(f"Returning batched job {companion.id} to the queue")
+                    continue
+                else:
+                    companion.status = JobStatus.FAILED
+                    companion.error = lead_job.error or "Batched generation was interrupted"
+                companion.completed_at = time.time()
+            print(f"Finishing batched job {companion.id} with status {companion.status}")
+
+        if requeued:
+            # Back at the front of the queue, in their original order
+            temp_queue = []
+            while not self.queue.empty():
+                temp_queue.append(self.queue.get())
+                self.queue.task_done()
+            for item in requeued + temp_queue:
+                self.queue.put(item)
+
     def _worker_loop(self):
         """Worker thread that processes jobs from the queue"""
         while True:
@@ -1366,6 +1490,9 @@ class VideoJobQueue:
                     self._check_and_process_completed_grids()
                     continue
 
+                companions = []
+                max_batch_size = int(Settings().get("cross_job_batch_size", 1) or 1)
+
                 with self.lock:
                     job = self.jobs.get(job_id)
                     if not job:
@@ -1439,6 +1566,13 @@ class VideoJobQueue:
                     job.started_at = time.time()
                     self.current_job = job
                     self.is_processing = True
+
+                    # Cross-job batching: compatible queued jobs are denoised in this job's batch
+                    companions = self.find_batch_companions(job, max_batch_size)
+                    for companion in companions:
+                        print(f"Batching job {companion.id} with job {job_id}")
+                        companion.status = JobStatus.RUNNING
+                        companion.started_at = time.time()
                 
                 job_completed = False
                 
@@ -1456,6 +1590,16 @@ class VideoJobQueue:
                         del worker_params['end_frame_image_original']
                     if 'end_frame_strength_original' in worker_params:
                         del worker_params['end_frame_strength_original']
+                    if companions:
+                        worker_params['batch_companions'] = [
+                            {
+                                'prompt_text': companion.params.get('prompt_text'),
+                                'n_prompt': companion.params.get('n_prompt'),
+                                'seed': companion.params.get('seed'),
+                                'job_stream': companion.stream,
+                            }
+                            for companion in companions
+                        ]
 
                     async_run(
                         self.worker_function,
@@ -1470,13 +1614,19 @@ class VideoJobQueue:
                     # Track activity time for logging purposes
                     last_activity_time = time.time()
                     
+                    waiting_for_batch = False
                     while True:
                         # Check if job has been cancelled before processing next output
                         with self.lock:
                             if job.status == JobStatus.CANCELLED:
-                                print(f"Job {job_id} was cancelled, breaking out of processing loop")
-                                job_completed = True
-                                break
+                                if not companions:
+                                    print(f"Job {job_id} was cancelled, breaking out of processing loop")
+                                    job_completed = True
+                                    break
+                                # Companion files are only final once the worker has pushed its 'end'
+                                if not waiting_for_batch:
+                                    print(f"Job {job_id} was cancelled, waiting for the worker to stop before settling its batched jobs")
+                                    waiting_for_batch = True
                         
                         # Get current time for activity checks
                         current_time = time.time()
@@ -1496,7 +1646,8 @@ class VideoJobQueue:
                             if flag == 'file':
                                 output_filename = data
                                 with self.lock:
-                                    job.result = output_filename
+                                    if job.status != JobStatus.CANCELLED:
+                                        job.result = output_filename
                             
                             elif flag == 'progress':
                                 preview, desc, html = data
@@ -1543,6 +1694,8 @@ class VideoJobQueue:
                                 job.error = "Job processing was interrupted"
                             
                             job.completed_at = time.time()
+
+                        self._finish_batch_companions(companions, job)
                     
                     print(f"Finishing job {job_id} with status {job.status}")
                     self.is_processing = False
@@ -344,6 +344,8 @@ def process(
         input_image_path,
         combine_with_source,
         num_cleaned_frames,
+        variants,
+        draft,
         *lora_args,
         save_metadata_checked=True,  # NEW: Parameter to control metadata saving
     ):
@@ -449,6 +451,8 @@ def process(
         'lora_loaded_names': lora_loaded_names,
         'combine_with_source': combine_with_source,  # Add combine_with_source parameter
         'num_cleaned_frames': num_cleaned_frames,
+        'variants': variants,
+        'draft': draft,
         'save_metadata_checked': save_metadata_checked,  # NEW: Add save_metadata_checked parameter
     }
     